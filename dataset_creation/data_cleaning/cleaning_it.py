@@ -1,10 +1,31 @@
+import argparse
+import os
+import sys
+import numpy as np
 import pandas as pd
 import re
 import string
 import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import filterfalse
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from nltk.corpus import stopwords
 
+# pyarrow is optional; it is only needed to clean Parquet files in chunks
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from dedup_index import DedupIndex, HashIndex, hash_descriptions
+
+# Dataset helpers shared by the dataset_creation scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dataset_io import read_dataset
+
 # Download necessary NLTK resources (run this once)
 import nltk
 try:
@@ -15,6 +36,49 @@ except LookupError:
 # Define Italian stopwords globally
 ITALIAN_STOPWORDS = set(stopwords.words('italian'))
 
+# Rows per chunk when a column is cleaned on a process pool
+DEFAULT_CHUNK_ROWS = 100_000
+
+# Files up to this size are cleaned whole by one worker; larger ones are split into row chunks
+PARALLEL_FILE_BYTES = 64 * 1024 ** 2
+
+def read_dataset_columns(file_path):
+    """
+    Reads the column names of a CSV or Parquet dataset without loading its rows.
+
+    Args:
+        file_path (str): The path to a .csv or .parquet file.
+
+    Returns:
+        list of str: The column names.
+    """
+    if file_path.endswith('.parquet'):
+        if pq is None:
+            raise ImportError("pyarrow is not installed. Install it using 'pip install pyarrow'.")
+        return pq.ParquetFile(file_path).schema_arrow.names
+    return list(pd.read_csv(file_path, nrows=0).columns)
+
+def iter_dataset(file_path, chunk_rows, columns=None):
+    """
+    Reads a CSV or Parquet dataset in chunks of rows.
+
+    Args:
+        file_path (str): The path to a .csv or .parquet file.
+        chunk_rows (int): The number of rows per chunk (Parquet chunks may be smaller at row group ends).
+        columns (list of str, optional): The columns to load (default: all).
+
+    Yields:
+        pd.DataFrame: The chunks, in file order.
+    """
+    if file_path.endswith('.parquet'):
+        if pq is None:
+            raise ImportError("pyarrow is not installed. Install it using 'pip install pyarrow'.")
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        with pd.read_csv(file_path, usecols=columns, chunksize=chunk_rows) as reader:
+            yield from reader
+
 def fix_encoding(text):
     """
     Fixes encoding issues in a string by attempting to re-encode and decode it.
@@ -31,6 +95,72 @@ def fix_encoding(text):
         # In case it's already correctly encoded or cannot be fixed
         return text
 
+# Patterns applied in order by the cleaners, compiled once
+PARENTHESES_PATTERN = re.compile(r'\([^)]*\)')
+PUNCTUATION_PATTERN = re.compile(r'[^\w\s]')
+NUMBERS_PATTERN = re.compile(r'\d+')
+
+class _CharacterTable(dict):
+    """
+    A `str.translate` table doing accent stripping, punctuation and number removal in one pass.
+
+    Each character maps to what the NFD decomposition without combining marks
+    (category Mn), punctuation replaced by spaces and digits removed leaves of
+    it. Entries are computed the first time a character is seen, and stored as
+    code points (or None for deletions) where possible, which lets
+    `str.translate` take its fast path on ASCII text.
+    """
+
+    def __missing__(self, code_point):
+        stripped = ''.join(char for char in unicodedata.normalize('NFD', chr(code_point))
+                           if unicodedata.category(char) != 'Mn')
+        translated = NUMBERS_PATTERN.sub('', PUNCTUATION_PATTERN.sub(' ', stripped))
+        if not translated:
+            value = None
+        elif len(translated) == 1:
+            value = ord(translated)
+        else:
+            value = translated
+        self[code_point] = value
+        return value
+
+CHARACTER_TABLE = _CharacterTable()
+
+# Maximum number of distinct tokens remembered by the cleaners before the memo is reset
+TOKEN_CACHE_SIZE = 1_000_000
+
+class _TokenCache(dict):
+    """
+    Memo of cleaned whitespace-separated tokens.
+
+    Lowercasing, the character table and the stopword filter never look past
+    whitespace, so a description can be cleaned token by token; descriptions
+    share most of their vocabulary, so nearly every token is a dictionary hit.
+    A token maps to its cleaned words joined by spaces, or to '' when nothing is left.
+    """
+
+    def __missing__(self, token):
+        if len(self) >= TOKEN_CACHE_SIZE:
+            self.clear()
+        words = token.lower().translate(CHARACTER_TABLE).split()
+        cleaned = " ".join(filterfalse(ITALIAN_STOPWORDS.__contains__, words))
+        self[token] = cleaned
+        return cleaned
+
+TOKEN_CACHE = _TokenCache()
+
+def _clean_text(text):
+    """
+    Clean one non-missing description; see `clean_italian_description`.
+    """
+    if not text.isascii():
+        text = fix_encoding(text)
+    # Parentheses are not affected by lowercasing, so they can be removed first
+    if '(' in text:
+        text = PARENTHESES_PATTERN.sub('', text)
+    # Apostrophes become spaces with the rest of the punctuation, which also splits contractions (l'arte -> l arte)
+    return " ".join(filter(None, map(TOKEN_CACHE.__getitem__, text.split())))
+
 def clean_italian_description(text):
     """
     Cleans a single Italian description string by removing noise, handling contractions,
@@ -44,37 +174,31 @@ def clean_italian_description(text):
     """
     if pd.isna(text):  # Handle NaN values
         return ""
+    return _clean_text(text)
 
-    # Fix encoding issues
-    text = fix_encoding(text)
-
-    # Convert to lowercase
-    text = text.lower()
-
-    # Remove parentheses and their content
-    text = re.sub(r'\([^)]*\)', '', text)
-
-    # Handle missing spaces around apostrophes and contractions
-    text = re.sub(r"(\b[a-zA-Z])'([a-z])", r"\1 \2", text)  # Replace apostrophe with a space between words
-
-    # Normalize text to remove accents
-    text = unicodedata.normalize('NFD', text)
-    text = ''.join(char for char in text if unicodedata.category(char) != 'Mn')
-
-    # Remove punctuation and replace with spaces
-    text = re.sub(r'[^\w\s]', ' ', text)
-
-    # Remove numbers
-    text = re.sub(r'\d+', '', text)
+def clean_italian_descriptions(texts):
+    """
+    Cleans a whole column of Italian descriptions, like `clean_italian_description` on every row.
 
-    # Tokenize and remove stopwords
-    text_tokens = text.split()
-    filtered_tokens = [word for word in text_tokens if word not in ITALIAN_STOPWORDS]
+    Each distinct token is cleaned once (lowercasing, then one `str.translate`
+    table for accents, punctuation and numbers, then the stopword filter) and
+    memoised, so most rows reduce to a split, dictionary lookups and a join.
+    The parentheses pattern only runs on rows that contain one, and the
+    encoding fix is skipped for ASCII rows, which it never changes. The output
+    is the same as applying `clean_italian_description` row by row.
 
-    # Join tokens back into a single string
-    cleaned_text = " ".join(filtered_tokens).strip()
+    Args:
+        texts (pd.Series): The descriptions; missing values become empty strings.
 
-    return cleaned_text
+    Returns:
+        pd.Series: The cleaned descriptions, with the same index.
+    """
+    missing = texts.isna().to_numpy()
+    cleaned = [
+        "" if is_missing else _clean_text(text)
+        for text, is_missing in zip(texts.to_numpy(dtype=object), missing)
+    ]
+    return pd.Series(cleaned, index=texts.index, name=texts.name)
 
 def transform_data(df):
     """
@@ -122,64 +246,367 @@ def validate_data(df):
     # Additional validation checks can be added here
     return True
 
-def load_and_clean_italian_descriptions_from_csv(file_paths):
+def clean_italian_descriptions_parallel(texts, executor=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Cleans a column like `clean_italian_descriptions`, spreading chunks of rows over a process pool.
+
+    The column is cut into chunks of `chunk_rows` rows, cleaned in the pool,
+    and put back together in their original order.
+
+    Args:
+        texts (pd.Series): The descriptions.
+        executor (ProcessPoolExecutor, optional): The pool to clean the chunks in
+            (default: clean in the current process).
+        chunk_rows (int, optional): The number of rows per chunk.
+
+    Returns:
+        pd.Series: The cleaned descriptions, with the same index.
+    """
+    if executor is None or len(texts) <= chunk_rows:
+        return clean_italian_descriptions(texts)
+    chunks = [texts.iloc[start:start + chunk_rows] for start in range(0, len(texts), chunk_rows)]
+    return pd.concat(executor.map(clean_italian_descriptions, chunks))
+
+def clean_dataset_file(file_path, executor=None, chunk_rows=DEFAULT_CHUNK_ROWS, seen=None):
     """
-    Loads Italian text data from multiple CSV files, performs cleaning on the 'descrizione' column
-    (and 'titolo' if present), removes duplicate descriptions, transforms the data, validates it,
-    and saves the DataFrame with cleaned and transformed columns.
+    Loads Italian text data from one CSV (or Parquet) file, performs cleaning on the 'descrizione'
+    column (and 'titolo' if present), removes duplicate descriptions, transforms the data, validates it,
+    and saves the DataFrame with cleaned and transformed columns next to the input.
 
     Args:
-        file_paths (list of str): A list containing the paths to the CSV files.
+        file_path (str): The path to the CSV (or Parquet) file.
+        executor (ProcessPoolExecutor, optional): A pool to clean the columns in, chunk by chunk.
+        chunk_rows (int, optional): The number of rows per chunk sent to the pool.
+        seen (HashIndex, optional): The descriptions kept from other files; rows whose description
+            is in it are dropped, and the descriptions of this file are added to it once it is saved.
+
+    Returns:
+        str: The output file, or None if the file could not be cleaned.
     """
-    for file_path in file_paths:
-        try:
-            df = pd.read_csv(file_path)
-            print(f"\nFirst 5 rows of the DataFrame from {file_path}:")
-            print(df.head())
-
-            # Ensure the required column exists
-            if 'descrizione' not in df.columns:
-                print(f"Warning: 'descrizione' column not found in {file_path}. Skipping this file.")
-                continue
-
-            # Debug: Check for missing values
-            print(f"\nMissing values in {file_path}:")
-            print(df.isnull().sum())
-
-            # Drop rows with missing descrizione
-            drop_cols = ['descrizione']
-            # If titolo exists, drop rows with missing titolo as well
-            if 'titolo' in df.columns:
-                drop_cols.append('titolo')
-            df = df.dropna(subset=drop_cols)
-            print(f"Rows remaining after dropping missing values in {drop_cols}: {len(df)}")
-
-            # Clean the 'descrizione' column
-            df['descrizione'] = df['descrizione'].apply(clean_italian_description)
-
-            # Clean the 'titolo' column if it exists
-            if 'titolo' in df.columns:
-                df['titolo'] = df['titolo'].apply(clean_italian_description)
-
-            # Remove duplicate descriptions
+    try:
+        df = read_dataset(file_path)
+        print(f"\nFirst 5 rows of the DataFrame from {file_path}:")
+        print(df.head())
+
+        # Ensure the required column exists
+        if 'descrizione' not in df.columns:
+            print(f"Warning: 'descrizione' column not found in {file_path}. Skipping this file.")
+            return None
+
+        # Debug: Check for missing values
+        print(f"\nMissing values in {file_path}:")
+        print(df.isnull().sum())
+
+        # Drop rows with missing descrizione
+        drop_cols = ['descrizione']
+        # If titolo exists, drop rows with missing titolo as well
+        if 'titolo' in df.columns:
+            drop_cols.append('titolo')
+        df = df.dropna(subset=drop_cols)
+        print(f"Rows remaining after dropping missing values in {drop_cols}: {len(df)}")
+
+        # Clean the 'descrizione' column
+        df['descrizione'] = clean_italian_descriptions_parallel(df['descrizione'], executor, chunk_rows)
+
+        # Clean the 'titolo' column if it exists
+        if 'titolo' in df.columns:
+            df['titolo'] = clean_italian_descriptions_parallel(df['titolo'], executor, chunk_rows)
+
+        # Remove duplicate descriptions (and those already kept from other files)
+        if seen is None:
             df = df.drop_duplicates(subset=['descrizione'], keep='first')
+        else:
+            index = HashIndex()
+            df = df[index.add_new(hash_descriptions(df['descrizione']), exclude=seen)]
+
+        # Transform the data
+        df = transform_data(df)
+
+        # Validate the data
+        if not validate_data(df):
+            print(f"Validation failed for {file_path}. Proceeding to save the cleaned data.")
+
+        # Save the DataFrame with cleaned and transformed columns
+        root, ext = os.path.splitext(file_path)
+        output_file = f"{root}_cleaned_transformed{ext}"
+        if ext == '.parquet':
+            df.to_parquet(output_file, index=False)
+        else:
+            df.to_csv(output_file, index=False)
+        print(f"Cleaned and transformed data saved to: {output_file}")
+        if seen is not None:
+            seen.merge(index)
+        return output_file
+
+    except FileNotFoundError:
+        print(f"Error: File not found at {file_path}")
+    except Exception as e:
+        print(f"An error occurred while processing {file_path}: {e}")
+    return None
+
+def clean_chunk(df):
+    """
+    Drops the rows missing 'descrizione' (or 'titolo', if present) and cleans both columns.
 
-            # Transform the data
-            df = transform_data(df)
+    Args:
+        df (pd.DataFrame): A chunk of a dataset.
 
-            # Validate the data
-            if not validate_data(df):
-                print(f"Validation failed for {file_path}. Proceeding to save the cleaned data.")
+    Returns:
+        pd.DataFrame: The cleaned chunk.
+    """
+    drop_cols = ['descrizione']
+    if 'titolo' in df.columns:
+        drop_cols.append('titolo')
+    df = df.dropna(subset=drop_cols)
+    df['descrizione'] = clean_italian_descriptions(df['descrizione'])
+    if 'titolo' in df.columns:
+        df['titolo'] = clean_italian_descriptions(df['titolo'])
+    return df
 
-            # Save the DataFrame with cleaned and transformed columns
-            output_file = file_path.replace('.csv', '_cleaned_transformed.csv')
-            df.to_csv(output_file, index=False)
-            print(f"Cleaned and transformed data saved to: {output_file}")
+def _cleaned_chunks(chunks, executor=None, max_pending=2):
+    """
+    Cleans chunks with `clean_chunk`, on a process pool if given, yielding them in their original order.
+
+    At most `max_pending` chunks are read ahead and waiting in the pool.
+    """
+    if executor is None:
+        for chunk in chunks:
+            yield clean_chunk(chunk)
+        return
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(clean_chunk, chunk))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+class ChunkedDatasetWriter:
+    """
+    Appends DataFrame chunks to a CSV file, or to a Parquet file one row group per chunk.
+
+    Args:
+        file_path (str): The file to write.
+        parquet (bool, optional): Write Parquet instead of CSV.
+    """
+
+    def __init__(self, file_path, parquet=False):
+        self.file_path = file_path
+        self.parquet = parquet
+        self.rows = 0
+        self._file = None
+        self._parquet_writer = None
+
+    @property
+    def started(self):
+        return self._file is not None or self._parquet_writer is not None
+
+    def write(self, df):
+        if self.parquet:
+            if pq is None:
+                raise ImportError("pyarrow is not installed. Install it using 'pip install pyarrow'.")
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.file_path, table.schema)
+            else:
+                table = table.cast(self._parquet_writer.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            header = self._file is None
+            if header:
+                self._file = open(self.file_path, 'w', newline='', encoding='utf-8')
+            df.to_csv(self._file, header=header, index=False)
+        self.rows += len(df)
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def clean_dataset_file_chunked(file_path, chunk_rows=DEFAULT_CHUNK_ROWS, executor=None, max_pending=2, seen=None):
+    """
+    Cleans one file like `clean_dataset_file`, in memory bounded by the chunk size instead of the file size.
+
+    The file is read `chunk_rows` rows at a time; every chunk is cleaned,
+    deduplicated and appended to the output before the next one is read.
+    Duplicates are found with a `HashIndex` of the 64-bit hashes of the cleaned
+    descriptions seen so far (8 bytes per unique description), so the first
+    occurrence of a description is kept, as with `drop_duplicates`. The output
+    is written to a `.part` file that replaces the output once complete.
+
+    `transform_data` fits its scaler and encoder on a whole DataFrame, so it is
+    not applied here, and neither is `validate_data`: missing values and
+    duplicate descriptions are already removed chunk by chunk.
+
+    Args:
+        file_path (str): The path to the CSV (or Parquet) file.
+        chunk_rows (int, optional): The number of rows read at a time.
+        executor (ProcessPoolExecutor, optional): A pool to clean the chunks in.
+        max_pending (int, optional): The maximum number of chunks waiting in the pool.
+        seen (HashIndex, optional): The descriptions kept from other files; rows whose description
+            is in it are dropped, and the descriptions of this file are added to it once it is saved.
+
+    Returns:
+        str: The output file, or None if the file could not be cleaned.
+    """
+    root, ext = os.path.splitext(file_path)
+    output_file = f"{root}_cleaned_transformed{ext}"
+    writer = ChunkedDatasetWriter(f"{output_file}.part", parquet=ext == '.parquet')
+    try:
+        columns = read_dataset_columns(file_path)
+        if 'descrizione' not in columns:
+            print(f"Warning: 'descrizione' column not found in {file_path}. Skipping this file.")
+            return None
+
+        index = HashIndex()
+        for chunk in _cleaned_chunks(iter_dataset(file_path, chunk_rows), executor, max_pending):
+            writer.write(chunk[index.add_new(hash_descriptions(chunk['descrizione']), exclude=seen)])
+        if not writer.started:
+            writer.write(pd.DataFrame(columns=columns))
+        writer.close()
+        os.replace(writer.file_path, output_file)
+        print(f"Cleaned data saved to: {output_file} ({writer.rows} unique rows, "
+              f"{index.nbytes / 1024 ** 2:.1f} MB of description hashes)")
+        if seen is not None:
+            seen.merge(index)
+        return output_file
+
+    except FileNotFoundError:
+        print(f"Error: File not found at {file_path}")
+    except Exception as e:
+        print(f"An error occurred while processing {file_path}: {e}")
+    finally:
+        writer.close()
+    if os.path.exists(writer.file_path):
+        os.remove(writer.file_path)
+    return None
+
+def output_description_hashes(output_file, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Hashes the descriptions of a cleaned output file, as they were added to the dedup index.
 
-        except FileNotFoundError:
-            print(f"Error: File not found at {file_path}")
-        except Exception as e:
-            print(f"An error occurred while processing {file_path}: {e}")
+    Args:
+        output_file (str): A file written by `clean_dataset_file` or `clean_dataset_file_chunked`.
+        chunk_rows (int, optional): The number of rows read at a time.
+
+    Returns:
+        np.ndarray: One uint64 hash per row.
+    """
+    if output_file.endswith('.parquet'):
+        chunks = (chunk['descrizione'] for chunk in iter_dataset(output_file, chunk_rows, ['descrizione']))
+    else:
+        # Read the descriptions back as the exact strings that were hashed (an empty one is not NaN)
+        reader = pd.read_csv(output_file, usecols=['descrizione'], dtype=str, keep_default_na=False,
+                             chunksize=chunk_rows)
+        chunks = (chunk['descrizione'] for chunk in reader)
+    hashes = [hash_descriptions(chunk) for chunk in chunks]
+    return np.concatenate(hashes) if hashes else np.empty(0, dtype=np.uint64)
+
+def load_and_clean_italian_descriptions_from_csv(file_paths, workers=1, chunk_rows=DEFAULT_CHUNK_ROWS, stream=False,
+                                                 dedup_index=None, new_dedup_index=False):
+    """
+    Cleans every file with `clean_dataset_file`, one after the other or on a pool of processes.
+
+    With more than one worker, files up to PARALLEL_FILE_BYTES are cleaned
+    whole, one per worker, while larger files are read in this process and
+    their columns are cleaned in chunks of `chunk_rows` rows on the same pool,
+    so one large file (such as all.csv) does not keep a single core busy while
+    the others idle.
+
+    With a `dedup_index`, descriptions are deduplicated across all the files
+    instead of within each one: a description is kept only in the first file
+    (in `file_paths` order) where it appears. The 64-bit hashes of the kept
+    descriptions are stored in the index file, which is loaded if it exists and
+    saved after every file, so files cleaned in later runs are deduplicated
+    against earlier ones too. Files are then cleaned one after the other, with
+    the workers sharing the chunks of each file.
+
+    The index also records which source files it was built from (see
+    `DedupIndex`), so a rerun never deduplicates a file against itself:
+    a file that is unchanged since it was added, and whose output still exists,
+    is skipped and its output kept; a file that changed has the descriptions
+    kept from it (read back from its previous output) removed from the index
+    and is cleaned again. A file whose previous output is missing cannot be
+    taken out of the index, so it is refused.
+
+    Args:
+        file_paths (list of str): A list containing the paths to the CSV (or Parquet) files.
+        workers (int, optional): The number of processes (default: 1, no pool; 0 or None: one per core).
+        chunk_rows (int, optional): The number of rows per chunk of a large file.
+        stream (bool, optional): Clean each file in chunks of `chunk_rows` rows with
+            `clean_dataset_file_chunked`, so no file is ever loaded whole; the
+            chunks of a file are spread over the workers.
+        dedup_index (str, optional): The hash index file shared by all the files (see `DedupIndex`).
+        new_dedup_index (bool, optional): Start the index over instead of loading it.
+
+    Returns:
+        list: The output file of each input file, in order (None for files that could not be cleaned).
+    """
+    index = seen = None
+    if dedup_index:
+        index = DedupIndex(dedup_index, reset=new_dedup_index)
+        seen = index.hashes
+        print(f"Deduplicating against {len(seen)} descriptions from {len(index.sources)} files in {dedup_index}")
+
+    if stream or seen is not None:
+        executor = ProcessPoolExecutor(max_workers=workers or None) if workers != 1 else None
+        max_pending = 2 * (workers or os.cpu_count() or 1)
+        output_files = []
+        try:
+            for file_path in file_paths:
+                removed = None
+                if index is not None:
+                    entry = index.source(file_path)
+                    if index.is_current(file_path):
+                        print(f"{file_path} is already in {dedup_index}; keeping {entry['output']}")
+                        output_files.append(entry['output'])
+                        continue
+                    if entry is not None:
+                        if not os.path.exists(entry['output']):
+                            print(f"Error: {file_path} is in {dedup_index} but its output {entry['output']} is "
+                                  f"missing, so its descriptions cannot be taken out of the index. "
+                                  f"Restore the output or start over with --new-dedup-index.")
+                            output_files.append(None)
+                            continue
+                        print(f"{file_path} changed since it was added to {dedup_index}; cleaning it again")
+                        removed = output_description_hashes(entry['output'], chunk_rows)
+                        index.remove_source(file_path, removed)
+
+                if stream:
+                    output_file = clean_dataset_file_chunked(file_path, chunk_rows, executor, max_pending, seen)
+                else:
+                    output_file = clean_dataset_file(file_path, executor, chunk_rows, seen)
+
+                if index is not None:
+                    if output_file is not None:
+                        index.add_source(file_path, output_file)
+                        index.save()
+                    elif removed is not None:
+                        # The previous output was left in place; put its descriptions back
+                        index.restore_source(file_path, entry, removed)
+                output_files.append(output_file)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return output_files
+
+    if workers == 1:
+        return [clean_dataset_file(file_path) for file_path in file_paths]
+
+    with ProcessPoolExecutor(max_workers=workers or None) as executor:
+        futures = {}
+        for file_path in file_paths:
+            if not os.path.exists(file_path) or os.path.getsize(file_path) <= PARALLEL_FILE_BYTES:
+                futures[file_path] = executor.submit(clean_dataset_file, file_path)
+        output_files = {
+            file_path: clean_dataset_file(file_path, executor, chunk_rows)
+            for file_path in file_paths if file_path not in futures
+        }
+        output_files.update((file_path, future.result()) for file_path, future in futures.items())
+    return [output_files[file_path] for file_path in file_paths]
 
 if __name__ == "__main__":
     # Updated file paths
@@ -194,4 +621,18 @@ if __name__ == "__main__":
         '../../../dataset/CH_IT/opere_arte_visiva/vaw.csv',
         '../../../dataset/CH_IT/total/all.csv'      
     ]
-    load_and_clean_italian_descriptions_from_csv(file_paths)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Clean the Italian descriptions of CSV (or Parquet) datasets.")
+    parser.add_argument("files", nargs="*", default=file_paths, help="Files to clean (default: the configured datasets).")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Number of processes (default: 1; 0 uses every core).")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS,
+                        help=f"Rows per chunk when a large file is split over the processes, or read with --stream (default: {DEFAULT_CHUNK_ROWS}).")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read, clean and write every file in chunks, for files larger than memory.")
+    parser.add_argument("--dedup-index", metavar="FILE",
+                        help="Deduplicate descriptions across all files (and runs) using this hash index file (.npy).")
+    parser.add_argument("--new-dedup-index", action="store_true",
+                        help="Start the --dedup-index file over instead of loading it.")
+    args = parser.parse_args()
+    load_and_clean_italian_descriptions_from_csv(args.files, args.workers, args.chunk_rows, args.stream,
+                                                 args.dedup_index, args.new_dedup_index)
@@ -0,0 +1,242 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+def hash_descriptions(texts):
+    """
+    Computes a 64-bit hash of every description.
+
+    The hash (SipHash with pandas' fixed key, over the UTF-8 bytes) does not
+    depend on the process or on the column's dtype, so hashes can be compared
+    across chunks, files and runs.
+
+    Args:
+        texts (pd.Series or sequence of str): The (cleaned) descriptions.
+
+    Returns:
+        np.ndarray: One uint64 hash per description.
+    """
+    return pd.util.hash_array(np.asarray(texts, dtype=object), categorize=False)
+
+class HashIndex:
+    """
+    A compact set of 64-bit description hashes, for deduplicating data that does not fit in memory.
+
+    Hashes are kept in sorted uint64 runs (8 bytes each, against ~70 for a
+    Python set of ints), which are merged as they grow, so that a whole chunk of
+    hashes is checked with a few binary searches and added in amortised
+    O(log n) per hash.
+
+    An index can be saved and loaded again (as a sorted .npy array), so that
+    files cleaned in different runs are deduplicated against each other.
+    """
+
+    def __init__(self):
+        self._runs = []
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads an index saved with `save`.
+
+        Args:
+            path (str): The index file.
+
+        Returns:
+            HashIndex: The loaded index.
+
+        Raises:
+            ValueError: If the file does not hold an array of uint64 hashes.
+        """
+        hashes = np.load(path, allow_pickle=False)
+        if hashes.dtype != np.uint64 or hashes.ndim != 1:
+            raise ValueError(f"{path} is not a description hash index.")
+        index = cls()
+        index._add_run(hashes)
+        return index
+
+    def save(self, path):
+        """
+        Saves the index as one sorted array, atomically.
+
+        Args:
+            path (str): The index file (conventionally ending in .npy).
+        """
+        self._compact()
+        hashes = self._runs[0] if self._runs else np.empty(0, dtype=np.uint64)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.save(f, hashes)
+        os.replace(temp_path, path)
+
+    def __len__(self):
+        return sum(len(run) for run in self._runs)
+
+    @property
+    def nbytes(self):
+        return sum(run.nbytes for run in self._runs)
+
+    def contains(self, hashes):
+        """
+        Tells which hashes are already in the index.
+
+        Args:
+            hashes (np.ndarray): uint64 hashes.
+
+        Returns:
+            np.ndarray: A boolean mask, True for the hashes in the index.
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        found = np.zeros(len(hashes), dtype=bool)
+        for run in self._runs:
+            positions = np.searchsorted(run, hashes)
+            positions[positions == len(run)] = 0
+            found |= run[positions] == hashes
+        return found
+
+    def add_new(self, hashes, exclude=None):
+        """
+        Adds hashes to the index, telling which ones were new.
+
+        A hash is new if it is not in the index (nor in `exclude`) and does not
+        appear earlier in `hashes`, so keeping the rows selected by the mask
+        deduplicates a chunk against itself and against every chunk added before it.
+
+        Args:
+            hashes (np.ndarray): uint64 hashes, in row order.
+            exclude (HashIndex, optional): Another index whose hashes also count as seen;
+                it is not modified.
+
+        Returns:
+            np.ndarray: A boolean mask, True for the first occurrence of each new hash.
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        unique, first = np.unique(hashes, return_index=True)
+        new = ~self.contains(unique)
+        if exclude is not None:
+            new &= ~exclude.contains(unique)
+        mask = np.zeros(len(hashes), dtype=bool)
+        mask[first[new]] = True
+        self._add_run(unique[new])
+        return mask
+
+    def remove(self, hashes):
+        """
+        Removes hashes from the index; hashes not in it are ignored.
+
+        Args:
+            hashes (np.ndarray): uint64 hashes.
+        """
+        hashes = np.unique(np.asarray(hashes, dtype=np.uint64))
+        runs = (run[~np.isin(run, hashes, assume_unique=True)] for run in self._runs)
+        self._runs = [run for run in runs if len(run)]
+
+    def merge(self, other):
+        """
+        Adds every hash of another index that was built with `add_new(..., exclude=self)`.
+
+        Args:
+            other (HashIndex): An index sharing no hash with this one.
+        """
+        for run in other._runs:
+            self._add_run(run)
+
+    def _add_run(self, run):
+        if not len(run):
+            return
+        self._runs.append(run)
+        # Merge runs of similar size, keeping O(log n) runs
+        while len(self._runs) > 1 and len(self._runs[-2]) <= 2 * len(self._runs[-1]):
+            last = self._runs.pop()
+            # Runs never share a hash; a stable sort merges two sorted runs in linear time
+            self._runs[-1] = np.sort(np.concatenate((self._runs[-1], last)), kind='stable')
+
+    def _compact(self):
+        if len(self._runs) > 1:
+            self._runs = [np.sort(np.concatenate(self._runs), kind='stable')]
+
+class DedupIndex:
+    """
+    A `HashIndex` saved to disk together with the source files whose descriptions it holds.
+
+    The hashes are stored in `path` and the sources in a sidecar JSON file
+    (`<path without extension>.sources.json`), keyed by absolute path, with the
+    size and modification time of each source and the output it was cleaned
+    into. This tells a rerun which files are already in the index, so their
+    descriptions are not mistaken for duplicates of themselves.
+
+    Args:
+        path (str): The index file (conventionally ending in .npy).
+        reset (bool, optional): Ignore the saved index and sources and start over.
+    """
+
+    def __init__(self, path, reset=False):
+        self.path = path
+        self.sources_path = f"{os.path.splitext(path)[0]}.sources.json"
+        self.hashes = HashIndex()
+        self.sources = {}
+        if not reset and os.path.exists(path):
+            self.hashes = HashIndex.load(path)
+            if os.path.exists(self.sources_path):
+                with open(self.sources_path, encoding='utf-8') as f:
+                    self.sources = json.load(f)
+
+    @staticmethod
+    def _stat(file_path):
+        stat = os.stat(file_path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def source(self, file_path):
+        """
+        Returns the recorded entry of a source file (its size, mtime and output), or None.
+        """
+        return self.sources.get(os.path.abspath(file_path))
+
+    def is_current(self, file_path):
+        """
+        Tells whether a source file is in the index, unchanged since it was cleaned, and its output still exists.
+        """
+        entry = self.source(file_path)
+        if entry is None or not os.path.exists(file_path) or not os.path.exists(entry["output"]):
+            return False
+        return all(entry[key] == value for key, value in self._stat(file_path).items())
+
+    def add_source(self, file_path, output_file):
+        """
+        Records that the descriptions kept from a source file (written to `output_file`) are in the index.
+        """
+        self.sources[os.path.abspath(file_path)] = {**self._stat(file_path), "output": os.path.abspath(output_file)}
+
+    def remove_source(self, file_path, hashes):
+        """
+        Removes a source file and the hashes of the descriptions kept from it.
+
+        Returns:
+            dict: The removed entry, or None if the file was not recorded.
+        """
+        self.hashes.remove(hashes)
+        return self.sources.pop(os.path.abspath(file_path), None)
+
+    def restore_source(self, file_path, entry, hashes):
+        """
+        Undoes `remove_source`, for a file that could not be cleaned again.
+        """
+        self.hashes.add_new(hashes)
+        self.sources[os.path.abspath(file_path)] = entry
+
+    def save(self):
+        """
+        Saves the sources, then the hashes, each atomically.
+
+        If the run stops in between, the saved sources are never missing from the
+        saved hashes. The worst case is a source whose hashes were not saved.
+        That can leave a duplicate in a later file, but it never empties a file
+        that was already cleaned.
+        """
+        temp_path = f"{self.sources_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.sources, f, indent=2)
+        os.replace(temp_path, self.sources_path)
+        self.hashes.save(self.path)
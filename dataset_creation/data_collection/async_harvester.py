@@ -0,0 +1,300 @@
+import asyncio
+import io
+import os
+import re
+import time
+from urllib.parse import urlparse
+
+from tqdm import tqdm
+
+# httpx is optional; without it requests are made with the shared requests session on worker threads
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from oai_client import (DEFAULT_HEADERS, DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT, OAI_ERROR_PATTERN, OAIError,
+                        call_with_retries_async, configure_session, fetch_page, get_cache, get_rate_limiter,
+                        parse_retry_after)
+from oai_parser import get_field_map, read_page
+from harvest_metrics import PageTiming, get_metrics, show_live_metrics, timed_read_page
+from harvest_state import HarvestCheckpoint, checkpoint_path
+from save_records import HarvestOutputs
+
+# Concurrent requests per endpoint host
+DEFAULT_PER_HOST_LIMIT = 4
+
+# Parsed pages waiting to be written, across all harvests; producers wait when it is full
+DEFAULT_QUEUE_SIZE = 32
+
+class HarvestJob:
+    """
+    One set of one endpoint, harvested by the asynchronous engine.
+
+    Args:
+        endpoint (str): The OAI-PMH endpoint URL.
+        set_name (str, optional): The set (setSpec) to harvest, or None for the whole repository.
+        metadata_prefix (str, optional): The metadata prefix (default: "pico").
+        from_date (str, optional): Only harvest records changed on or after this OAI datestamp.
+        until_date (str, optional): Only harvest records changed on or before this OAI datestamp.
+    """
+
+    def __init__(self, endpoint, set_name=None, metadata_prefix="pico", from_date=None, until_date=None):
+        self.endpoint = endpoint
+        self.set_name = set_name
+        self.metadata_prefix = metadata_prefix
+        self.from_date = from_date
+        self.until_date = until_date
+        self.name = set_name or urlparse(endpoint).netloc
+        self.outputs = None
+        self.records = 0
+        self.finished = False
+        self.error = None
+
+    @property
+    def host(self):
+        return urlparse(self.endpoint).netloc
+
+def create_async_client(max_connections, timeout=DEFAULT_TIMEOUT):
+    """
+    Create an httpx client with connection pooling, keep-alive and compression.
+
+    Args:
+        max_connections (int): Maximum number of pooled connections, over all hosts.
+        timeout (float or tuple, optional): Timeout in seconds, or a (connect, read) tuple.
+
+    Returns:
+        httpx.AsyncClient: The configured client.
+    """
+    if httpx is None:
+        raise ImportError("httpx is not installed. Install it using 'pip install httpx'.")
+    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    return httpx.AsyncClient(
+        headers=DEFAULT_HEADERS,
+        timeout=httpx.Timeout(read, connect=connect),
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        follow_redirects=True,
+    )
+
+async def fetch_page_async(endpoint, params, client=None):
+    """
+    Download a complete OAI-PMH response body without blocking the event loop.
+
+    With an httpx client the request is made on the event loop itself; without
+    one, `oai_client.fetch_page` runs on a worker thread. Both honour the
+    response cache and the per-host rate limit.
+
+    Args:
+        endpoint (str): The OAI-PMH endpoint URL.
+        params (dict): The query parameters.
+        client (httpx.AsyncClient, optional): The client to send the request with.
+
+    Returns:
+        bytes: The (decompressed) response body.
+
+    Raises:
+        OAIError: If the endpoint does not answer with HTTP 200, or the page is
+            missing from an offline cache.
+    """
+    if client is None:
+        return await asyncio.to_thread(fetch_page, endpoint, params)
+
+    cache = get_cache()
+    if cache is not None:
+        content = await asyncio.to_thread(cache.get, endpoint, params)
+        if content is not None:
+            return content
+        if cache.offline:
+            raise OAIError(f"Page not in cache (offline mode): {params}")
+
+    delay = get_rate_limiter(endpoint).reserve()
+    if delay:
+        await asyncio.sleep(delay)
+    try:
+        response = await client.get(endpoint, params=params)
+    except httpx.TransportError as e:
+        # Reported as a connection error, so it is retried like a failed requests call
+        raise ConnectionError(str(e) or type(e).__name__) from e
+    if response.status_code != 200:
+        raise OAIError(f"Unable to fetch data. HTTP Status Code: {response.status_code}",
+                       status=response.status_code, retry_after=parse_retry_after(response))
+    content = response.content
+    if cache is not None and not OAI_ERROR_PATTERN.search(content):
+        await asyncio.to_thread(cache.put, endpoint, params, content)
+    return content
+
+def _open_outputs(job, base_name, save_csv, save_xml, save_parquet, shard_rows, resume):
+    """
+    Open the outputs of a job, resuming them from its checkpoint if asked to.
+
+    Returns:
+        str: The resumption token to start from, or None to start from the first page.
+    """
+    checkpoint_file = checkpoint_path(f"{base_name}.csv")
+    if resume and os.path.exists(checkpoint_file):
+        checkpoint = HarvestCheckpoint.load(checkpoint_file)
+        if checkpoint.resumption_token is None:
+            # The last page was written but the checkpoint was not cleaned up
+            checkpoint.complete()
+            job.records = checkpoint.records
+            job.finished = True
+            return None
+    else:
+        checkpoint = HarvestCheckpoint(checkpoint_file, job.endpoint, job.set_name, job.metadata_prefix)
+    field_map = get_field_map(checkpoint.metadata_prefix)
+    job.outputs = HarvestOutputs(field_map.columns, f"{base_name}.csv" if save_csv else None,
+                                 f"{base_name}.xml" if save_xml else None, checkpoint, shard_rows,
+                                 f"{base_name}.parquet" if save_parquet else None, field_map.multi_valued)
+    return checkpoint.resumption_token
+
+async def _harvest_job(job, client, semaphore, queue, base_name, save_csv, save_xml, save_parquet, test_limit,
+                       shard_rows, resume):
+    """
+    Page through the ListRecords response of one job, queueing every parsed page for the writer.
+
+    A job that fails is reported and recorded in `job.error`; it does not affect the other jobs.
+    """
+    try:
+        field_map = get_field_map(job.metadata_prefix)
+        resumption_token = await asyncio.to_thread(_open_outputs, job, base_name, save_csv, save_xml,
+                                                   save_parquet, shard_rows, resume)
+        if job.finished:
+            return
+        if resumption_token:
+            params = {"verb": "ListRecords", "resumptionToken": resumption_token}
+        else:
+            params = {"verb": "ListRecords", "metadataPrefix": job.metadata_prefix}
+            if job.set_name:
+                params["set"] = job.set_name
+            if job.from_date:
+                params["from"] = job.from_date
+            if job.until_date:
+                params["until"] = job.until_date
+
+        metrics = get_metrics()
+
+        async def load_page(endpoint, params, limit):
+            # Only the download holds a slot of the host; parsing runs on a worker thread
+            async with semaphore:
+                start = time.perf_counter()
+                content = await fetch_page_async(endpoint, params, client)
+                network = time.perf_counter() - start
+            if metrics is None:
+                return await asyncio.to_thread(read_page, io.BytesIO(content), limit, field_map) + (None,)
+            timing = PageTiming(job.set_name, network=network)
+            return await asyncio.to_thread(timed_read_page, io.BytesIO(content), limit, field_map, timing) + (timing,)
+
+        fetched = 0
+        while job.error is None:
+            limit = test_limit - fetched if test_limit else None
+            page, resumption_token, truncated, timing = await call_with_retries_async(load_page, job.endpoint,
+                                                                                     params, limit)
+            fetched += len(page)
+            if truncated or (test_limit and fetched >= test_limit):
+                resumption_token = None
+            await queue.put((job, page, resumption_token, timing))
+            if resumption_token is None:
+                job.finished = True
+                return
+            params = {"verb": "ListRecords", "resumptionToken": resumption_token}
+    except Exception as e:
+        job.error = e
+        print(f"Error harvesting set '{job.name}': {e}")
+    finally:
+        # Tells the writer to close the outputs of the job
+        await queue.put((job, None, None, None))
+
+async def _write_pages(queue, pbar):
+    """
+    Write the queued pages to the outputs of their job, one page at a time, until the queue yields None.
+    """
+    metrics = get_metrics()
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        job, page, resumption_token, timing = item
+        try:
+            if page is None:
+                if job.outputs is not None:
+                    await asyncio.to_thread(job.outputs.close)
+                    if job.finished and job.error is None:
+                        job.outputs.checkpoint.complete()
+            elif job.error is None:
+                start = time.perf_counter()
+                await asyncio.to_thread(job.outputs.write_page, page, resumption_token)
+                job.records = job.outputs.written
+                pbar.update(len(page))
+                if timing is not None:
+                    timing.write = time.perf_counter() - start
+                    metrics.add_page(timing)
+                    if show_live_metrics():
+                        pbar.set_postfix_str(metrics.live_summary(), refresh=False)
+        except Exception as e:
+            if job.error is None:
+                job.error = e
+                print(f"Error writing set '{job.name}': {e}")
+
+async def harvest_async(jobs, output_dir, save_csv=True, save_xml=False, save_parquet=False, test_limit=None,
+                        per_host_limit=DEFAULT_PER_HOST_LIMIT, queue_size=DEFAULT_QUEUE_SIZE, resume=False,
+                        shard_rows=None, timeout=DEFAULT_TIMEOUT):
+    """
+    Harvest many sets, from one or many endpoints, concurrently on one event loop.
+
+    Every job pages through its ListRecords response as a coroutine. At most
+    `per_host_limit` requests are in flight per endpoint host, whatever the
+    number of jobs, so dozens of slow providers can be kept busy without a
+    thread per set. Parsed pages go through one bounded queue to a single
+    writer, which appends them to the job's outputs and updates its checkpoint;
+    when the writer falls behind, the harvests wait.
+
+    Outputs are named after the set (prefixed with the host when the jobs span
+    several endpoints) and checkpointed like `harvest_set`. A failing job is
+    reported and does not stop the others.
+
+    Args:
+        jobs (list): The `HarvestJob`s to run.
+        output_dir (str): The directory to write the output files to.
+        save_csv (bool, optional): Write one CSV file per job.
+        save_xml (bool, optional): Write one XML file per job.
+        save_parquet (bool, optional): Write one Parquet file per job.
+        test_limit (int, optional): Limit the number of records fetched per job.
+        per_host_limit (int, optional): Maximum concurrent requests per endpoint host.
+        queue_size (int, optional): Maximum number of parsed pages waiting to be written.
+        resume (bool, optional): Continue each job from its checkpoint if one exists.
+        shard_rows (int, optional): Rotate each CSV output into shards of this many rows.
+        timeout (float or tuple, optional): Timeout in seconds, or a (connect, read) tuple (httpx only).
+
+    Returns:
+        dict: The number of records written per job name; failed jobs are mapped to the exception raised.
+    """
+    hosts = {job.host for job in jobs}
+    if len(hosts) > 1:
+        for job in jobs:
+            job.name = f"{job.host}_{job.set_name}" if job.set_name else job.host
+
+    semaphores = {host: asyncio.Semaphore(per_host_limit) for host in hosts}
+    queue = asyncio.Queue(maxsize=queue_size)
+    if httpx is not None:
+        client = create_async_client(per_host_limit * len(hosts), timeout)
+    else:
+        client = None
+        configure_session(pool_size=max(DEFAULT_POOL_SIZE, per_host_limit))
+
+    try:
+        with tqdm(desc=f"Harvesting {len(jobs)} sets", unit="record",
+                  bar_format="{l_bar}{bar}| {n_fmt} records [{elapsed}, {rate_fmt}{postfix}]") as pbar:
+            writer = asyncio.create_task(_write_pages(queue, pbar))
+            await asyncio.gather(*(
+                _harvest_job(job, client, semaphores[job.host], queue,
+                             os.path.join(output_dir, re.sub(r'[^\w.-]', '_', job.name)),
+                             save_csv, save_xml, save_parquet, test_limit, shard_rows, resume)
+                for job in jobs
+            ))
+            await queue.put(None)
+            await writer
+    finally:
+        if client is not None:
+            await client.aclose()
+
+    return {job.name: job.error if job.error is not None else job.records for job in jobs}
@@ -0,0 +1,207 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# resource is not available on Windows; peak memory is then not reported
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from mock_oai_server import DEFAULT_PAGE_SIZE, MockOAIServer
+
+# Harvesting modes the benchmark compares
+MODES = ("stream", "prefetch", "threads", "async", "identifiers")
+
+# Concurrency of the threaded, asynchronous and by-identifiers modes
+DEFAULT_WORKERS = 4
+
+def peak_memory_mb():
+    """
+    Return the peak resident memory of the current process in MB, or None if it cannot be measured.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+def run_mode(mode, endpoint, set_names, output_dir, workers=DEFAULT_WORKERS):
+    """
+    Harvest every set with one harvesting mode, in the current process.
+
+    Modes:
+        stream: one set after the other, page by page (`harvest_set`).
+        prefetch: as stream, downloading the next page while the current one is written.
+        threads: the sets on a pool of `workers` threads (`harvest_sets`).
+        async: the sets on one event loop, `workers` requests in flight (`harvest_async`).
+        identifiers: one set after the other, ListIdentifiers then `workers` concurrent
+            GetRecord calls (`harvest_by_identifiers`).
+
+    Args:
+        mode (str): One of MODES.
+        endpoint (str): The OAI-PMH endpoint URL.
+        set_names (list): The sets to harvest.
+        output_dir (str): The directory to write the CSV outputs to.
+        workers (int, optional): The concurrency of the mode.
+
+    Returns:
+        dict: The records harvested, the elapsed seconds, records per second,
+        the time to the first written record and the peak memory in MB.
+
+    Raises:
+        ValueError: If the mode is unknown.
+    """
+    # Imported here so the parent process does not pay for (or share) the harvester's state
+    from async_harvester import HarvestJob, harvest_async
+    from harvest_metrics import HarvestMetrics, configure_metrics
+    from list_records_download import harvest_by_identifiers, harvest_set, harvest_sets
+
+    metrics = HarvestMetrics()
+    configure_metrics(metrics)
+    start = time.perf_counter()
+    if mode in ("stream", "prefetch"):
+        results = {set_name: harvest_set(endpoint, set_name, output_dir, prefetch=mode == "prefetch")
+                   for set_name in set_names}
+    elif mode == "threads":
+        results = harvest_sets(endpoint, set_names, output_dir, max_workers=workers, per_endpoint_limit=workers)
+    elif mode == "async":
+        jobs = [HarvestJob(endpoint, set_name) for set_name in set_names]
+        results = asyncio.run(harvest_async(jobs, output_dir, per_host_limit=workers))
+    elif mode == "identifiers":
+        results = {set_name: harvest_by_identifiers(endpoint, set_name, os.path.join(output_dir, f"{set_name}.csv"),
+                                                    max_workers=workers)
+                   for set_name in set_names}
+    else:
+        raise ValueError(f"Unknown harvesting mode '{mode}'. Expected one of: {', '.join(MODES)}.")
+    elapsed = time.perf_counter() - start
+
+    errors = [str(result) for result in results.values() if isinstance(result, Exception)]
+    records = sum(result for result in results.values() if not isinstance(result, Exception))
+    return {
+        "mode": mode,
+        "records": records,
+        "seconds": elapsed,
+        "records_per_second": records / elapsed if elapsed else 0.0,
+        "time_to_first_record": metrics.report()["time_to_first_record"],
+        "peak_memory_mb": peak_memory_mb(),
+        "errors": errors,
+    }
+
+def benchmark_mode(mode, endpoint, set_names, workers=DEFAULT_WORKERS):
+    """
+    Run one harvesting mode in a fresh Python process, so its peak memory and timings are its own.
+
+    Returns:
+        dict: The result of `run_mode`.
+
+    Raises:
+        RuntimeError: If the child process fails.
+    """
+    with tempfile.TemporaryDirectory(prefix=f"benchmark_{mode}_") as output_dir:
+        command = [sys.executable, os.path.abspath(__file__), "--run-mode", mode, "--endpoint", endpoint,
+                   "--workers", str(workers), "--output-dir", output_dir, "--set-names", *set_names]
+        process = subprocess.run(command, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"Mode '{mode}' failed:\n{process.stderr.strip()}")
+    # Harvest functions print progress to stdout; the result is the last line
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+def run_benchmark(modes, sets, page_size=DEFAULT_PAGE_SIZE, latency=0.0, error_rate=0.0, repeat=1,
+                  workers=DEFAULT_WORKERS):
+    """
+    Benchmark harvesting modes against a local mock OAI-PMH server.
+
+    Every run harvests all sets from a fresh `MockOAIServer` in its own
+    process; with `repeat`, the best run of each mode (highest throughput) is kept.
+
+    Args:
+        modes (list): The modes to benchmark (see `run_mode`).
+        sets (dict): The number of records of each set served.
+        page_size (int, optional): Records per page.
+        latency (float, optional): Server delay in seconds per request.
+        error_rate (float, optional): Probability of an HTTP 503 answer.
+        repeat (int, optional): Number of runs per mode.
+        workers (int, optional): The concurrency of the concurrent modes.
+
+    Returns:
+        list: One result dict per mode, with the number of requests served.
+    """
+    results = []
+    for mode in modes:
+        best = None
+        for _ in range(repeat):
+            with MockOAIServer(sets=sets, page_size=page_size, latency=latency, error_rate=error_rate) as server:
+                result = benchmark_mode(mode, server.url, list(sets), workers)
+                result["requests"] = server.requests
+            if best is None or result["records_per_second"] > best["records_per_second"]:
+                best = result
+        results.append(best)
+        print(format_result(best))
+    return results
+
+def format_result(result):
+    ttfr = result["time_to_first_record"]
+    memory = result["peak_memory_mb"]
+    line = (f"{result['mode']:<12} {result['records']:>8} records {result['seconds']:>8.2f} s "
+            f"{result['records_per_second']:>10.0f} rec/s  first record "
+            f"{f'{ttfr:.3f} s' if ttfr is not None else 'n/a':>9}  peak "
+            f"{f'{memory:.0f} MB' if memory is not None else 'n/a':>7}  {result['requests']:>6} requests")
+    if result["errors"]:
+        line += f"  ({len(result['errors'])} failed sets)"
+    return line
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the harvesting modes against a local mock OAI-PMH server: "
+                    "records per second, time to first record and peak memory."
+    )
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES),
+                        help="Harvesting modes to benchmark (default: all).")
+    parser.add_argument("--sets", type=int, default=4, help="Number of sets served (default: 4).")
+    parser.add_argument("--records", type=int, default=5000, help="Records per set (default: 5000).")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE,
+                        help=f"Records per page (default: {DEFAULT_PAGE_SIZE}).")
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="Server delay in seconds per request (default: 0.02).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of an HTTP 503 answer.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Concurrency of the threads, async and identifiers modes (default: {DEFAULT_WORKERS}).")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per mode; the best is kept (default: 1).")
+    parser.add_argument("--output", help="Save the results as JSON to this file.")
+    # Internal: run one mode in this process and print its result as JSON
+    parser.add_argument("--run-mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--endpoint", help=argparse.SUPPRESS)
+    parser.add_argument("--set-names", nargs="+", help=argparse.SUPPRESS)
+    parser.add_argument("--output-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_mode:
+        print(json.dumps(run_mode(args.run_mode, args.endpoint, args.set_names, args.output_dir, args.workers)))
+        return
+
+    sets = {f"bench_{index}": args.records for index in range(args.sets)}
+    print(f"Benchmarking {len(args.modes)} modes: {args.sets} sets of {args.records} records, "
+          f"{args.page_size} per page, {args.latency:.3f} s latency, {args.error_rate:.0%} errors")
+    try:
+        results = run_benchmark(args.modes, sets, args.page_size, args.latency, args.error_rate, args.repeat,
+                                args.workers)
+    except Exception as e:
+        print(f"Error during benchmark: {e}")
+        sys.exit(1)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"parameters": {key: value for key, value in vars(args).items()
+                                      if key not in ("run_mode", "endpoint", "set_names", "output_dir", "output")},
+                       "results": results}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
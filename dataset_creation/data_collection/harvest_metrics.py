@@ -0,0 +1,236 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+from harvest_state import write_json_atomic
+from oai_parser import read_page
+
+# Phases a page goes through, in order; the time of each is recorded per page
+PHASES = ("network", "parse", "extract", "write")
+
+class PageTiming:
+    """
+    The time spent on each phase of one harvested page.
+
+    `network` is the time spent waiting for the response: until the headers
+    arrive and then in every read of the body (which also covers gzip
+    decompression). `parse` is the XML parsing time, `extract` the time spent
+    in the field map, and `write` the time spent writing the page to every
+    output and updating the checkpoint. Times are in seconds.
+
+    Args:
+        set_name (str): The harvested set (or None).
+        records (int, optional): The number of records in the page.
+        bytes (int, optional): The size of the (decompressed) response body.
+        network (float, optional): The network wait.
+    """
+
+    __slots__ = ("set_name", "records", "bytes", "network", "parse", "extract", "write")
+
+    def __init__(self, set_name, records=0, bytes=0, network=0.0):
+        self.set_name = set_name
+        self.records = records
+        self.bytes = bytes
+        self.network = network
+        self.parse = 0.0
+        self.extract = 0.0
+        self.write = 0.0
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class TimedReader:
+    """
+    Wrap a binary file-like object, accumulating the time spent in `read` and the bytes returned.
+
+    Args:
+        source (file-like): The wrapped object, e.g. a streaming response body.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def read(self, size=-1):
+        start = time.perf_counter()
+        data = self.source.read(size)
+        self.seconds += time.perf_counter() - start
+        self.bytes += len(data)
+        return data
+
+class TimedExtractor:
+    """
+    Wrap a field map, accumulating the time spent extracting records.
+
+    Args:
+        field_map (FieldMap): The wrapped field map.
+    """
+
+    def __init__(self, field_map):
+        self.field_map = field_map
+        self.seconds = 0.0
+
+    def extract(self, record):
+        start = time.perf_counter()
+        try:
+            return self.field_map.extract(record)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+def timed_read_page(source, limit, field_map, timing):
+    """
+    Parse a page like `oai_parser.read_page`, adding the network, parse and extraction times to `timing`.
+
+    Args:
+        source (file-like): The response body.
+        limit (int): Stop after this many records (or None).
+        field_map (FieldMap): The fields to extract.
+        timing (PageTiming): The timing of the page.
+
+    Returns:
+        tuple: The return value of `read_page`.
+    """
+    reader = TimedReader(source)
+    extractor = TimedExtractor(field_map)
+    start = time.perf_counter()
+    result = read_page(reader, limit, extractor)
+    elapsed = time.perf_counter() - start
+    timing.records = len(result[0])
+    timing.bytes += reader.bytes
+    timing.network += reader.seconds
+    timing.extract += extractor.seconds
+    timing.parse += max(0.0, elapsed - reader.seconds - extractor.seconds)
+    return result
+
+class HarvestMetrics:
+    """
+    Per-page timing of harvests, summarised into a report.
+
+    The report tells where the time of a harvest went, per phase and per set,
+    and which phase bounds it: a network-bound harvest gains from more
+    concurrency or prefetching, a parse- or extract-bound one from more CPU,
+    and a write-bound one from faster storage or fewer outputs. It can be
+    shared by the workers of a batch harvest.
+    """
+
+    def __init__(self):
+        self.started = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self._pages = []
+        self._first_record = None
+        # Running totals for the live summary, so it does not re-sum every page
+        self._seconds = dict.fromkeys(PHASES, 0.0)
+        self._records = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def add_page(self, timing):
+        """
+        Record a page once it has been written.
+
+        Args:
+            timing (PageTiming): The timing of the page.
+        """
+        with self._lock:
+            self._pages.append(timing)
+            for phase in PHASES:
+                self._seconds[phase] += getattr(timing, phase)
+            self._records += timing.records
+            self._bytes += timing.bytes
+            if self._first_record is None and timing.records:
+                self._first_record = time.perf_counter() - self._start
+
+    @staticmethod
+    def _summarise(pages):
+        totals = {phase: sum(getattr(page, phase) for page in pages) for phase in PHASES}
+        busy = sum(totals.values())
+        return {
+            "pages": len(pages),
+            "records": sum(page.records for page in pages),
+            "bytes": sum(page.bytes for page in pages),
+            "seconds": totals,
+            "shares": {phase: totals[phase] / busy if busy else 0.0 for phase in PHASES},
+            "bound": max(PHASES, key=totals.get) if busy else None,
+        }
+
+    def live_summary(self):
+        """
+        Return a one-line summary, for the postfix of a progress bar.
+
+        Built from running totals, so its cost does not grow with the number of pages.
+        """
+        with self._lock:
+            seconds = dict(self._seconds)
+            size = self._bytes
+        elapsed = time.perf_counter() - self._start
+        busy = sum(seconds.values())
+        shares = " ".join(f"{phase} {seconds[phase] / busy if busy else 0.0:.0%}" for phase in PHASES)
+        return f"{size / elapsed / 1024 ** 2:.2f} MB/s, {shares}"
+
+    def report(self):
+        """
+        Summarise the recorded pages.
+
+        Returns:
+            dict: The totals and per-phase times of the whole run and of each set,
+            the time until the first record was written, and the timing of every page.
+        """
+        with self._lock:
+            pages = list(self._pages)
+            first_record = self._first_record
+        elapsed = time.perf_counter() - self._start
+        sets = {}
+        for page in pages:
+            sets.setdefault(page.set_name or "", []).append(page)
+        report = {
+            "started": self.started.isoformat(timespec="seconds"),
+            "elapsed": elapsed,
+            "time_to_first_record": first_record,
+            **self._summarise(pages),
+            "records_per_second": sum(page.records for page in pages) / elapsed if elapsed else 0.0,
+            "sets": {set_name: self._summarise(set_pages) for set_name, set_pages in sets.items()},
+            "page_timings": [page.to_dict() for page in pages],
+        }
+        return report
+
+    def write_report(self, path):
+        """
+        Write the report as JSON.
+
+        Args:
+            path (str): The report file.
+
+        Returns:
+            dict: The report.
+        """
+        report = self.report()
+        write_json_atomic(path, report)
+        return report
+
+_metrics = None
+_live = False
+
+def configure_metrics(metrics, live=False):
+    """
+    Record the timing of every harvested page.
+
+    Args:
+        metrics (HarvestMetrics): The metrics to record into, or None to disable timing.
+        live (bool, optional): Show the running summary on the progress bars.
+    """
+    global _metrics, _live
+    _metrics = metrics
+    _live = live
+
+def get_metrics():
+    """
+    Return the configured metrics, or None.
+    """
+    return _metrics
+
+def show_live_metrics():
+    """
+    Tell whether the running summary should be shown on the progress bars.
+    """
+    return _metrics is not None and _live
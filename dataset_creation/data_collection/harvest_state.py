@@ -0,0 +1,245 @@
+import csv
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+def write_json_atomic(path, data):
+    """
+    Durably write a JSON document, replacing the previous version atomically.
+
+    The document is written to a temporary file, synced to disk and then renamed
+    over `path`, so a crash never leaves a truncated file behind.
+
+    Args:
+        path (str): The destination file.
+        data (dict): The JSON-serialisable document.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, mode='w', encoding='utf-8') as file:
+        json.dump(data, file, indent=2)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+class HarvestCheckpoint:
+    """
+    Progress of a ListRecords harvest, persisted after every page so it can be resumed.
+
+    The checkpoint records the resumption token of the next page to request, the
+    number of pages and records already written and, for every output file, its
+    position (byte offset, and shard for sharded CSV) at that point. On resume the
+    outputs are truncated back to those positions, so a page that was partially
+    written when the harvest died is written again exactly once.
+
+    Args:
+        path (str): The checkpoint file.
+        endpoint (str): The OAI-PMH endpoint URL.
+        set_name (str): The set being harvested (or None).
+        metadata_prefix (str): The metadata prefix.
+        outputs (dict, optional): The output files by format ("csv", "xml", ...).
+        shard_rows (int, optional): The shard size of the CSV output, if sharded.
+    """
+
+    def __init__(self, path, endpoint, set_name, metadata_prefix, outputs=None, shard_rows=None):
+        self.path = path
+        self.endpoint = endpoint
+        self.set_name = set_name
+        self.metadata_prefix = metadata_prefix
+        self.outputs = outputs or {}
+        self.shard_rows = shard_rows
+        self.resumption_token = None
+        self.pages = 0
+        self.records = 0
+        self.positions = {}
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a checkpoint written by a previous harvest.
+
+        Args:
+            path (str): The checkpoint file.
+
+        Returns:
+            HarvestCheckpoint: The restored checkpoint.
+        """
+        with open(path, mode='r', encoding='utf-8') as file:
+            data = json.load(file)
+        checkpoint = cls(path, data["endpoint"], data["set"], data["metadata_prefix"], data["outputs"],
+                         data.get("shard_rows"))
+        checkpoint.resumption_token = data["resumption_token"]
+        checkpoint.pages = data["pages"]
+        checkpoint.records = data["records"]
+        checkpoint.positions = data["positions"]
+        return checkpoint
+
+    def update(self, resumption_token, records, positions):
+        """
+        Record that one more page has been written and persist the checkpoint.
+
+        Args:
+            resumption_token (str): The token of the next page to request.
+            records (int): The total number of records written so far.
+            positions (dict): The position of each output after the page, from the writers' `position()`.
+        """
+        self.resumption_token = resumption_token
+        self.pages += 1
+        self.records = records
+        self.positions = positions
+        write_json_atomic(self.path, {
+            "endpoint": self.endpoint,
+            "set": self.set_name,
+            "metadata_prefix": self.metadata_prefix,
+            "outputs": self.outputs,
+            "resumption_token": self.resumption_token,
+            "pages": self.pages,
+            "records": self.records,
+            "shard_rows": self.shard_rows,
+            "positions": self.positions,
+            "updated": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        })
+
+    def complete(self):
+        """
+        Remove the checkpoint once the harvest has finished.
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def checkpoint_path(output_file):
+    """
+    Return the checkpoint file used for an output file.
+    """
+    return f"{os.path.splitext(output_file)[0]}.checkpoint.json"
+
+# OAI-PMH datestamp formats; every repository supports day granularity
+DAY_GRANULARITY = "YYYY-MM-DD"
+SECONDS_GRANULARITY = "YYYY-MM-DDThh:mm:ssZ"
+
+def format_datestamp(moment, granularity=DAY_GRANULARITY):
+    """
+    Format a datetime as an OAI-PMH `from`/`until` argument.
+
+    Args:
+        moment (datetime): An aware datetime.
+        granularity (str, optional): The granularity advertised by the repository's Identify response.
+
+    Returns:
+        str: The formatted datestamp, in UTC.
+    """
+    moment = moment.astimezone(timezone.utc)
+    if granularity == SECONDS_GRANULARITY:
+        return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return moment.strftime("%Y-%m-%d")
+
+class HarvestStateStore:
+    """
+    Local store of the last successful harvest time of each endpoint/set/prefix.
+
+    The store is a small JSON file, read once and rewritten atomically on every
+    update. Concurrent harvests must share one store (updates are serialised by
+    a lock); separate stores of the same file would overwrite each other's entries.
+
+    Args:
+        path (str): The state file; it is created on the first update.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._state = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, mode='r', encoding='utf-8') as file:
+                self._state = json.load(file)
+
+    @staticmethod
+    def _key(endpoint, set_name, metadata_prefix):
+        return f"{endpoint}|{set_name or ''}|{metadata_prefix}"
+
+    def last_harvest(self, endpoint, set_name, metadata_prefix):
+        """
+        Return when the set was last harvested successfully.
+
+        Returns:
+            datetime: The start time of the last successful harvest, or None.
+        """
+        entry = self._state.get(self._key(endpoint, set_name, metadata_prefix))
+        return datetime.fromisoformat(entry["last_harvest"]) if entry else None
+
+    def record_harvest(self, endpoint, set_name, metadata_prefix, started, records):
+        """
+        Record a successful harvest.
+
+        Args:
+            endpoint (str): The OAI-PMH endpoint URL.
+            set_name (str): The harvested set (or None).
+            metadata_prefix (str): The metadata prefix.
+            started (datetime): When the harvest started; the next harvest asks for changes since then.
+            records (int): The number of new or changed records harvested.
+        """
+        with self._lock:
+            self._state[self._key(endpoint, set_name, metadata_prefix)] = {
+                "last_harvest": started.isoformat(timespec="seconds"),
+                "records": records,
+            }
+            write_json_atomic(self.path, self._state)
+
+class IdentifierManifest:
+    """
+    Header identifiers and datestamps of the records already stored in an output.
+
+    Used to skip records that have not changed since they were fetched. The
+    manifest is a two-column CSV file (identifier, datestamp), rewritten
+    atomically by `save()`.
+
+    Args:
+        path (str): The manifest file; it is created on the first save.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.datestamps = {}
+        if os.path.exists(path):
+            with open(path, mode='r', newline='', encoding='utf-8') as file:
+                self.datestamps = {row["identifier"]: row["datestamp"] for row in csv.DictReader(file)}
+
+    def is_current(self, identifier, datestamp):
+        """
+        Tell whether the stored version of a record is the one with the given datestamp.
+        """
+        return self.datestamps.get(identifier) == datestamp
+
+    def update(self, datestamps):
+        """
+        Record the datestamps of fetched records.
+
+        Args:
+            datestamps (dict): The datestamp of each fetched identifier.
+        """
+        self.datestamps.update(datestamps)
+
+    def discard(self, identifier):
+        """
+        Forget a record, e.g. one that has been deleted.
+        """
+        self.datestamps.pop(identifier, None)
+
+    def clear(self):
+        """
+        Forget every record.
+        """
+        self.datestamps = {}
+
+    def save(self):
+        """
+        Durably write the manifest, replacing the previous version atomically.
+        """
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, mode='w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(["identifier", "datestamp"])
+            writer.writerows(self.datestamps.items())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
@@ -1,12 +1,28 @@
-import requests
-import xml.etree.ElementTree as ET
-import csv
 import sys
 from tqdm import tqdm
 import argparse
-from xml.dom.minidom import parseString
+import asyncio
 import os
 import glob
+import io
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+from oai_client import (DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT, OAIError, call_with_retries, configure_cache,
+                        configure_retries, configure_session, fetch_page, open_page, set_rate_limit)
+from oai_parser import (PICO_FIELD_MAP, RESUMPTION_TOKEN_TAIL, find_oai_error, find_resumption_token, get_field_map,
+                        load_field_map, parse_list_identifiers, parse_list_sets, read_page, register_field_map)
+from harvest_state import (DAY_GRANULARITY, SECONDS_GRANULARITY, HarvestCheckpoint, HarvestStateStore,
+                           IdentifierManifest, checkpoint_path, format_datestamp)
+from async_harvester import HarvestJob, harvest_async
+from harvest_metrics import (HarvestMetrics, PageTiming, configure_metrics, get_metrics, show_live_metrics,
+                             timed_read_page)
+from response_cache import DEFAULT_MAX_BYTES as DEFAULT_CACHE_MAX_BYTES, ResponseCache
+from save_records import HarvestOutputs, merge_csv_records
 
 # Use pyreadline3 on Windows, readline on other platforms
 if os.name == "nt":
@@ -47,157 +63,774 @@ VERBS = {
     "5": "ListRecords"  # Default verb
 }
 
-def fetch_records(endpoint, verb, set_name=None, metadata_prefix="pico", test_limit=None):
+# Verbs whose raw responses are followed through resumption tokens and saved one file per page
+PAGED_VERBS = ("ListIdentifiers", "ListSets")
+
+# Size of the blocks copied from a raw response to disk
+RAW_CHUNK_SIZE = 64 * 1024
+
+# Columns of the records extracted from ListRecords responses with the default (PICO) field map
+RECORD_FIELDS = PICO_FIELD_MAP.columns
+
+# Number of records above which fetch_records, which keeps the whole set in memory, warns
+IN_MEMORY_RECORD_LIMIT = 100000
+
+# Batch harvesting defaults: worker pool size and concurrent harvests per endpoint host
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_PER_ENDPOINT_LIMIT = 4
+
+# File, in the output directory, storing the last harvest time of each set
+HARVEST_STATE_FILE = "harvest_state.json"
+
+_endpoint_semaphores = {}
+_endpoint_semaphores_lock = threading.Lock()
+
+class RecordPage(list):
+    """
+    The records of one ListRecords page.
+
+    Behaves as a plain list and additionally carries the resumption token of the
+    next page (None on the last page), which is what a checkpoint must store,
+    and its `PageTiming` when harvest metrics are enabled.
+    """
+
+    def __init__(self, records=(), resumption_token=None, timing=None):
+        super().__init__(records)
+        self.resumption_token = resumption_token
+        self.timing = timing
+
+def iter_record_pages(endpoint, set_name=None, metadata_prefix="pico", test_limit=None, prefetch=False,
+                      resumption_token=None, from_date=None, until_date=None):
+    """
+    Harvest a ListRecords response page by page, following resumption tokens.
+
+    Only the records of the page currently being processed are held in memory, so
+    the consumer can write each page out before the next one is requested.
+
+    In pipelined mode (`prefetch=True`) each page is downloaded in full, its
+    resumption token is read straight from the raw bytes and the next page is
+    requested on a background thread while the current one is parsed and
+    consumed, so network transfer overlaps parsing and writing.
+
+    Records are extracted with the field map registered for `metadata_prefix`
+    (see `oai_parser.get_field_map`).
+
+    Args:
+        endpoint (str): The OAI-PMH endpoint URL.
+        set_name (str, optional): The dataset name (set) to harvest.
+        metadata_prefix (str, optional): The metadata prefix (default: "pico").
+        test_limit (int, optional): Limit the number of records fetched for testing purposes.
+        prefetch (bool, optional): Download the next page while the current one is processed.
+        resumption_token (str, optional): Start from this token instead of the first page,
+            e.g. when resuming from a checkpoint.
+        from_date (str, optional): Only harvest records changed on or after this OAI datestamp.
+        until_date (str, optional): Only harvest records changed on or before this OAI datestamp.
+
+    Yields:
+        RecordPage: The records parsed from one resumption-token page.
+
+    When the repository announces `completeListSize` in its resumption tokens,
+    the progress bar gets a total and an ETA; the announced size is also
+    available on `RecordPage.resumption_token`.
+
+    Transient failures (connection resets, timeouts, 429/503 responses,
+    badResumptionToken) are retried page by page with jittered exponential
+    backoff, honouring Retry-After; see `oai_client.call_with_retries`.
+
+    Raises:
+        OAIError: If the endpoint keeps failing or answers with a permanent error.
+        ValueError: If no field map is registered for `metadata_prefix`.
+    """
+    field_map = get_field_map(metadata_prefix)
+    resuming = bool(resumption_token)
+    if resumption_token:
+        params = {
+            "verb": "ListRecords",
+            "resumptionToken": resumption_token
+        }
+    else:
+        params = {
+            "verb": "ListRecords"
+        }
+        if set_name:
+            params["set"] = set_name
+        if metadata_prefix:
+            params["metadataPrefix"] = metadata_prefix
+        if from_date:
+            params["from"] = from_date
+        if until_date:
+            params["until"] = until_date
+
+    fetched = 0
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    next_page = None
+    metrics = get_metrics()
+
+    def load_page(endpoint, params, limit):
+        """
+        Download and parse one page; retried as a whole on transient errors.
+        """
+        nonlocal next_page
+        response = None
+        prefetched_token = None
+        start = time.perf_counter()
+        try:
+            if prefetch:
+                pending, next_page = next_page, None
+                content = pending.result() if pending is not None else fetch_page(endpoint, params)
+                prefetched_token = find_resumption_token(content)
+                if prefetched_token is not None:
+                    next_page = executor.submit(call_with_retries, fetch_page, endpoint,
+                                                {"verb": "ListRecords", "resumptionToken": prefetched_token})
+                source = io.BytesIO(content)
+            else:
+                # Parse the body while it is still downloading
+                response = open_page(endpoint, params)
+                source = response.raw
+            if metrics is None:
+                return read_page(source, limit, field_map) + (prefetched_token, None)
+            timing = PageTiming(set_name, network=time.perf_counter() - start)
+            return timed_read_page(source, limit, field_map, timing) + (prefetched_token, timing)
+        except Exception:
+            if next_page is not None:
+                next_page.cancel()
+                next_page = None
+            raise
+        finally:
+            if response is not None:
+                response.close()
+
+    try:
+        with tqdm(desc=f"Fetching {set_name or 'listrecords'}", unit="record", bar_format="{l_bar}{bar}| {n_fmt} records [{elapsed}<{remaining}, {rate_fmt}{postfix}]") as pbar:
+            while True:
+                limit = test_limit - fetched if test_limit else None
+                page, resumption_token, truncated, prefetched_token, timing = call_with_retries(load_page, endpoint, params, limit)
+                fetched += len(page)
+                pbar.update(len(page))
+                if pbar.total is None and resumption_token is not None and resumption_token.complete_list_size:
+                    # The repository announces the size of the list: show a real ETA
+                    pbar.total = min(resumption_token.complete_list_size, test_limit or resumption_token.complete_list_size)
+                    if resuming and resumption_token.cursor is not None:
+                        pbar.n = resumption_token.cursor + len(page)
+                    pbar.refresh()
+                if show_live_metrics():
+                    pbar.set_postfix_str(metrics.live_summary(), refresh=False)
+
+                # Stop fetching if test limit is reached
+                if truncated or (test_limit and fetched >= test_limit):
+                    yield RecordPage(page, timing=timing)
+                    print("\nTest limit reached. Stopping fetch.")
+                    return
+
+                yield RecordPage(page, resumption_token, timing)
+
+                # Check for resumptionToken for pagination
+                if resumption_token is None:
+                    break
+                if next_page is not None and resumption_token != prefetched_token:
+                    # The raw scan disagreed with the parser; refetch the right page
+                    next_page.cancel()
+                    next_page = None
+                params = {
+                    "verb": "ListRecords",
+                    "resumptionToken": resumption_token
+                }
+
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+def iter_records(endpoint, set_name=None, metadata_prefix="pico", test_limit=None, prefetch=False):
+    """
+    Harvest a ListRecords response, yielding one record at a time.
+
+    Args:
+        endpoint (str): The OAI-PMH endpoint URL.
+        set_name (str, optional): The dataset name (set) to harvest.
+        metadata_prefix (str, optional): The metadata prefix (default: "pico").
+        test_limit (int, optional): Limit the number of records fetched for testing purposes.
+        prefetch (bool, optional): Download the next page while the current one is processed.
+
+    Yields:
+        dict: A single harvested record.
+    """
+    for page in iter_record_pages(endpoint, set_name, metadata_prefix, test_limit, prefetch):
+        yield from page
+
+def fetch_records(endpoint, verb, set_name=None, metadata_prefix="pico", test_limit=None, prefetch=False):
     """
     Fetch records or perform other OAI-PMH operations from the endpoint.
 
+    For large sets prefer `iter_record_pages` or `iter_records`, which do not
+    accumulate the whole harvest in memory.
+
     Args:
         endpoint (str): The OAI-PMH endpoint URL.
         verb (str): The OAI-PMH verb to use (e.g., "ListRecords").
         set_name (str, optional): The dataset name (set) for "ListRecords" or "ListIdentifiers".
         metadata_prefix (str, optional): The metadata prefix (default: "pico").
         test_limit (int, optional): Limit the number of records fetched for testing purposes.
+        prefetch (bool, optional): Download the next ListRecords page while the current one is processed.
 
     Returns:
-        list: A list of fetched records.
+        list: A list of fetched records, or for other verbs the raw XML of the first
+        response page as a string (see `save_raw_output` to save every page to disk).
     """
-    records = []
+    if verb == "ListRecords":
+        try:
+            records = []
+            for page in iter_record_pages(endpoint, set_name, metadata_prefix, test_limit, prefetch):
+                size = page.resumption_token.complete_list_size if page.resumption_token is not None else None
+                if not records and size and size > IN_MEMORY_RECORD_LIMIT and not test_limit:
+                    print(f"Warning: {set_name or 'the repository'} announces {size} records, all kept in memory. "
+                          f"Use iter_record_pages and save_record_pages to stream them to disk instead.")
+                records.extend(page)
+            return records
+        except Exception as e:
+            print(f"Error during fetching data: {e}")
+            sys.exit(1)
+
     params = {
         "verb": verb
     }
-    if set_name and verb in ["ListRecords", "ListIdentifiers"]:
+    if set_name and verb == "ListIdentifiers":
         params["set"] = set_name
-    if metadata_prefix and verb in ["ListRecords", "ListIdentifiers"]:
+    if metadata_prefix and verb == "ListIdentifiers":
         params["metadataPrefix"] = metadata_prefix
 
     try:
-        with tqdm(desc=f"Fetching {verb.lower()}", unit="record", bar_format="{l_bar}{bar}| {n_fmt} records [{elapsed}<{remaining}, {rate_fmt}]") as pbar:
-            while True:
-                response = requests.get(endpoint, params=params)
-                if response.status_code != 200:
-                    print(f"Error: Unable to fetch data. HTTP Status Code: {response.status_code}")
-                    sys.exit(1)
-
-                root = ET.fromstring(response.content)
-                ns = {
-                    'oai': 'http://www.openarchives.org/OAI/2.0/',
-                    'dc': 'http://purl.org/dc/elements/1.1/',
-                    'pico': 'http://purl.org/pico/1.0/'
-                }
-
-                if verb == "ListRecords":
-                    for record in root.findall('.//oai:record', ns):
-                        metadata = record.find('oai:metadata', ns)
-                        if metadata is not None:
-                            pico_record = metadata.find('pico:record', ns)
-                            if pico_record is not None:
-                                identifier = pico_record.find('dc:identifier', ns)
-                                title = pico_record.find('dc:title', ns)
-                                description = pico_record.find('dc:description', ns)
-
-                                # Handle multiple dc:subject elements
-                                subjects = pico_record.findall('dc:subject', ns)
-                                subject_values = "; ".join(subject.text or "" for subject in subjects if subject is not None)
-
-                                # Handle multiple dc:type elements
-                                types = pico_record.findall('dc:type', ns)
-                                type_values = "; ".join(type_.text or "" for type_ in types if type_ is not None)
-
-                                records.append({
-                                    "identifier": identifier.text if identifier is not None else "",
-                                    "title": title.text if title is not None else "",
-                                    "description": description.text if description is not None else "",
-                                    "type": type_values,
-                                    "subject": subject_values
-                                })
-                                pbar.update(1)
-
-                                # Stop fetching if test limit is reached
-                                if test_limit and len(records) >= test_limit:
-                                    print("\nTest limit reached. Stopping fetch.")
-                                    return records
-
-                    # Check for resumptionToken for pagination
-                    resumption_token = root.find('.//oai:resumptionToken', ns)
-                    if resumption_token is None or resumption_token.text is None:
-                        break
-                    params = {
-                        "verb": "ListRecords",
-                        "resumptionToken": resumption_token.text
-                    }
-                else:
-                    # For other verbs, return the raw XML response
-                    return ET.tostring(root, encoding="unicode")
-
+        # For other verbs, return the raw XML response as received
+        return call_with_retries(fetch_page, endpoint, params).decode("utf-8")
     except Exception as e:
         print(f"Error during fetching data: {e}")
         sys.exit(1)
 
-    return records
-
-def save_to_csv(records, output_file):
+def write_raw_page(endpoint, params, output_file):
     """
-    Save records to a CSV file.
+    Stream one OAI-PMH response body to a file, exactly as received.
+
+    The body is copied block by block, so only the last few kilobytes are held in
+    memory, which is enough to find the resumption token and any OAI-PMH error.
 
     Args:
-        records (list): The list of records to save.
-        output_file (str): The file to save the CSV output to.
+        endpoint (str): The OAI-PMH endpoint URL.
+        params (dict): The query parameters.
+        output_file (str): The file to write; it is overwritten, so the call can be retried.
+
+    Returns:
+        str: The resumption token of the next page, or None if this is the last page.
+
+    Raises:
+        OAIError: If the response carries an OAI-PMH error other than noRecordsMatch.
     """
+    tail = b""
+    response = open_page(endpoint, params)
     try:
-        with open(output_file, mode='w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ["identifier", "title", "description", "type", "subject"]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            writer.writeheader()
-            for record in records:
-                writer.writerow(record)
-    except Exception as e:
-        print(f"Error saving to CSV: {e}")
-        sys.exit(1)
+        with open(output_file, mode='wb') as file:
+            while True:
+                chunk = response.raw.read(RAW_CHUNK_SIZE)
+                if not chunk:
+                    break
+                file.write(chunk)
+                tail = (tail + chunk)[-RESUMPTION_TOKEN_TAIL:]
+    finally:
+        response.close()
 
-def save_to_xml(records, output_file, stylesheet=None):
+    error = find_oai_error(tail)
+    # An empty list (e.g. ListIdentifiers of an empty set) is saved as is
+    if error is not None and error[0] != "noRecordsMatch":
+        code, message = error
+        raise OAIError(f"OAI-PMH error {code}: {message}", code=code)
+    return find_resumption_token(tail)
+
+def save_raw_output(endpoint, verb, output_file, set_name=None, metadata_prefix="pico"):
     """
-    Save records to an XML file with optional XSL stylesheet.
+    Save the raw responses of an OAI-PMH verb, streaming each body straight to disk.
+
+    Responses are written unchanged, without being parsed and serialised again.
+    ListIdentifiers and ListSets responses are followed through their resumption
+    tokens and saved one file per page, numbered like CSV shards
+    (`<name>-00000.xml`, `<name>-00001.xml`, ...); other verbs are saved to `output_file`.
 
     Args:
-        records (list): The list of records to save.
+        endpoint (str): The OAI-PMH endpoint URL.
+        verb (str): The OAI-PMH verb to use (e.g., "ListSets").
         output_file (str): The file to save the XML output to.
-        stylesheet (str, optional): The path to an XSL stylesheet to include in the XML.
+        set_name (str, optional): The set to list, for "ListIdentifiers".
+        metadata_prefix (str, optional): The metadata prefix, for "ListIdentifiers" (default: "pico").
+
+    Returns:
+        list: The files written, in page order.
     """
+    params = {
+        "verb": verb
+    }
+    if set_name and verb == "ListIdentifiers":
+        params["set"] = set_name
+    if metadata_prefix and verb == "ListIdentifiers":
+        params["metadataPrefix"] = metadata_prefix
+
+    if verb not in PAGED_VERBS:
+        call_with_retries(write_raw_page, endpoint, params, output_file)
+        return [output_file]
+
+    root, ext = os.path.splitext(output_file)
+    files = []
+    with tqdm(desc=f"Saving {verb}", unit="page") as pbar:
+        while True:
+            page_file = f"{root}-{len(files):05d}{ext}"
+            resumption_token = call_with_retries(write_raw_page, endpoint, params, page_file)
+            files.append(page_file)
+            pbar.update(1)
+            if resumption_token is None:
+                return files
+            params = {
+                "verb": verb,
+                "resumptionToken": resumption_token
+            }
+
+def save_record_pages(pages, csv_output_file=None, xml_output_file=None, checkpoint=None, shard_rows=None,
+                      parquet_output_file=None, field_map=None):
+    """
+    Consume a stream of record pages, writing each page as soon as it arrives.
+
+    Every output is appended and flushed page by page, so memory does not grow
+    with the size of the set and the files are usable while the harvest runs.
+    Errors raised while harvesting or writing are propagated to the caller.
+
+    With a checkpoint, the outputs are synced to disk and the checkpoint is
+    updated after every page; a checkpoint that already holds progress resumes
+    its own outputs at their recorded positions.
+
+    Args:
+        pages (iterable): An iterable of `RecordPage`s, e.g. from `iter_record_pages`.
+        csv_output_file (str, optional): The file to save the CSV output to.
+        xml_output_file (str, optional): The file to save the XML output to.
+        checkpoint (HarvestCheckpoint, optional): The checkpoint to keep up to date.
+        shard_rows (int, optional): Rotate the CSV output into shards of this many rows
+            (a resumed checkpoint keeps its own shard size).
+        parquet_output_file (str, optional): The file to save the Parquet output to,
+            written one row group per page.
+        field_map (FieldMap, optional): The field map the records were extracted with, giving the
+            output columns (default: the map of the checkpoint's metadata prefix, or PICO).
+
+    Returns:
+        int: The number of records written.
+    """
+    if field_map is None:
+        field_map = get_field_map(checkpoint.metadata_prefix) if checkpoint is not None else PICO_FIELD_MAP
+
+    outputs = HarvestOutputs(field_map.columns, csv_output_file, xml_output_file, checkpoint, shard_rows,
+                             parquet_output_file, field_map.multi_valued)
+    metrics = get_metrics()
     try:
-        # Create the root element
-        root = ET.Element("ListRecords")
-
-        # Add each record as a child element
-        for record in records:
-            record_elem = ET.SubElement(root, "record")
-            for key, value in record.items():
-                if key in ["type", "subject"] and value:  # Handle splitting for 'type' and 'subject'
-                    for item in value.split("; "):  # Split by "; " and create separate tags
-                        child = ET.SubElement(record_elem, key)
-                        child.text = item
-                else:
-                    child = ET.SubElement(record_elem, key)
-                    child.text = value
+        for page in pages:
+            start = time.perf_counter()
+            outputs.write_page(page, page.resumption_token)
+            if metrics is not None:
+                # Pages built without timing (e.g. from GetRecord calls) still count their write time
+                timing = page.timing if page.timing is not None else PageTiming(None, records=len(page))
+                timing.write = time.perf_counter() - start
+                metrics.add_page(timing)
+    finally:
+        outputs.close()
 
-        # Convert the XML tree to a string
-        cleaned_xml = ET.tostring(root, encoding="unicode")
+    if checkpoint is not None:
+        checkpoint.complete()
+    return outputs.written
 
-        # Pretty-print the XML
-        dom = parseString(cleaned_xml)
-        pretty_xml = dom.toprettyxml(indent="  ")
+def resume_harvest(checkpoint_file, prefetch=False):
+    """
+    Resume an interrupted ListRecords harvest from its checkpoint.
 
-        # Add optional XSL stylesheet
-        if stylesheet:
-            stylesheet_declaration = f'<?xml-stylesheet type="text/xsl" href="{stylesheet}"?>\n'
-            pretty_xml = pretty_xml.replace('<?xml version="1.0" encoding="UTF-8"?>', f'<?xml version="1.0" encoding="UTF-8"?>\n{stylesheet_declaration}')
+    Harvesting restarts from the stored resumption token and every output is
+    continued from its stored position.
 
-        # Save the formatted XML to the file
-        with open(output_file, mode='w', encoding='utf-8') as file:
-            file.write(pretty_xml)
-    except Exception as e:
-        print(f"Error saving records to XML: {e}")
-        sys.exit(1)
+    Args:
+        checkpoint_file (str): The checkpoint written by the interrupted harvest.
+        prefetch (bool, optional): Download the next page while the current one is processed.
+
+    Returns:
+        int: The total number of records in the outputs.
+    """
+    checkpoint = HarvestCheckpoint.load(checkpoint_file)
+    if checkpoint.resumption_token is None:
+        # The last page was written but the checkpoint was not cleaned up
+        checkpoint.complete()
+        return checkpoint.records
+    print(f"Resuming {checkpoint.set_name or 'harvest'} after page {checkpoint.pages} "
+          f"({checkpoint.records} records) into {', '.join(checkpoint.outputs.values())}")
+    pages = iter_record_pages(checkpoint.endpoint, checkpoint.set_name, checkpoint.metadata_prefix,
+                              prefetch=prefetch, resumption_token=checkpoint.resumption_token)
+    return save_record_pages(pages, checkpoint=checkpoint)
+
+def harvest_incremental(endpoint, set_name, csv_output_file, state_file, metadata_prefix="pico",
+                        granularity=DAY_GRANULARITY, prefetch=False, state_store=None):
+    """
+    Bring a CSV harvest up to date by fetching only the records changed since the last run.
+
+    The first run (or a run without an existing output) harvests the full set.
+    Later runs ask the endpoint for records with a datestamp from the start of the
+    previous successful harvest onwards, and merge them into the existing output,
+    replacing records with the same identifier. The time of each successful
+    harvest is kept in `state_file`.
+
+    Deleted records carry no PICO metadata and are therefore not removed from the output.
+
+    Args:
+        endpoint (str): The OAI-PMH endpoint URL.
+        set_name (str): The dataset name (set) to harvest.
+        csv_output_file (str): The CSV file holding the harvest.
+        state_file (str): The JSON file storing the last harvest time of each set.
+        metadata_prefix (str, optional): The metadata prefix (default: "pico").
+        granularity (str, optional): The datestamp granularity supported by the endpoint.
+        prefetch (bool, optional): Download the next page while the current one is processed.
+        state_store (HarvestStateStore, optional): The store of `state_file`, when it is shared by
+            concurrent harvests (default: open `state_file`).
+
+    Returns:
+        int: The number of new or changed records harvested.
+    """
+    store = state_store or HarvestStateStore(state_file)
+    last_harvest = store.last_harvest(endpoint, set_name, metadata_prefix)
+    started = datetime.now(timezone.utc)
+
+    if last_harvest is None or not os.path.exists(csv_output_file):
+        checkpoint = HarvestCheckpoint(checkpoint_path(csv_output_file), endpoint, set_name, metadata_prefix)
+        pages = iter_record_pages(endpoint, set_name, metadata_prefix, prefetch=prefetch)
+        harvested = save_record_pages(pages, csv_output_file, checkpoint=checkpoint)
+    else:
+        from_date = format_datestamp(last_harvest, granularity)
+        print(f"Fetching records of {set_name or 'all sets'} changed since {from_date}")
+        changes_file = f"{os.path.splitext(csv_output_file)[0]}.changes.csv"
+        pages = iter_record_pages(endpoint, set_name, metadata_prefix, prefetch=prefetch, from_date=from_date)
+        harvested = save_record_pages(pages, changes_file, field_map=get_field_map(metadata_prefix))
+        if harvested:
+            merge_csv_records(csv_output_file, changes_file)
+        os.remove(changes_file)
+
+    store.record_harvest(endpoint, set_name, metadata_prefix, started, harvested)
+    return harvested
+
+def fetch_record(endpoint, identifier, metadata_prefix="pico", field_map=None):
+    """
+    Fetch a single record with GetRecord.
+
+    Args:
+        endpoint (str): The OAI-PMH endpoint URL.
+        identifier (str): The OAI identifier of the record (from its header).
+        metadata_prefix (str, optional): The metadata prefix (default: "pico").
+        field_map (FieldMap, optional): The fields to extract (default: PICO).
+
+    Returns:
+        dict: The extracted record, or None if the record no longer exists or has
+        no metadata in this format.
+    """
+    params = {
+        "verb": "GetRecord",
+        "identifier": identifier,
+        "metadataPrefix": metadata_prefix
+    }
+    try:
+        records, _, _ = read_page(io.BytesIO(fetch_page(endpoint, params)), field_map=field_map)
+    except OAIError as e:
+        if e.code == "idDoesNotExist":
+            return None
+        raise
+    return records[0] if records else None
+
+def harvest_by_identifiers(endpoint, set_name, csv_output_file, metadata_prefix="pico", max_workers=DEFAULT_MAX_WORKERS,
+                           from_date=None, until_date=None):
+    """
+    Bring a CSV harvest up to date by listing identifiers first and fetching only new or changed records.
+
+    For providers that serve ListRecords pages slowly. The set is listed with the
+    cheap ListIdentifiers verb, and every header is compared with the manifest
+    stored next to the output (`<name>.identifiers.csv`). Only records that are
+    new or carry a different datestamp are fetched, with up to `max_workers`
+    concurrent GetRecord calls per ListIdentifiers page. They are merged into the
+    existing output as in `harvest_incremental`, and the manifest is saved once
+    the merge has succeeded, so an interrupted run simply starts over.
+
+    The first run (or a run without an existing output) fetches every record.
+    Deleted records are dropped from the manifest but not removed from the output.
+
+    Args:
+        endpoint (str): The OAI-PMH endpoint URL.
+        set_name (str): The dataset name (set) to harvest.
+        csv_output_file (str): The CSV file holding the harvest.
+        metadata_prefix (str, optional): The metadata prefix (default: "pico").
+        max_workers (int, optional): Maximum concurrent GetRecord calls.
+        from_date (str, optional): Only list records changed on or after this OAI datestamp.
+        until_date (str, optional): Only list records changed on or before this OAI datestamp.
+
+    Returns:
+        int: The number of new or changed records harvested.
+    """
+    field_map = get_field_map(metadata_prefix)
+    root = os.path.splitext(csv_output_file)[0]
+    manifest = IdentifierManifest(f"{root}.identifiers.csv")
+    merging = os.path.exists(csv_output_file)
+    if not merging:
+        manifest.clear()
+    changes_file = f"{root}.changes.csv" if merging else csv_output_file
+    fetched = {}
+
+    # Every GetRecord worker needs its own pooled connection
+    configure_session(pool_size=max(DEFAULT_POOL_SIZE, max_workers))
+
+    def get_record(header):
+        return call_with_retries(fetch_record, endpoint, header[0], metadata_prefix, field_map)
+
+    def changed_pages():
+        params = {
+            "verb": "ListIdentifiers",
+            "metadataPrefix": metadata_prefix
+        }
+        if set_name:
+            params["set"] = set_name
+        if from_date:
+            params["from"] = from_date
+        if until_date:
+            params["until"] = until_date
+        with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+                tqdm(desc=f"Checking {set_name or 'identifiers'}", unit="identifier") as pbar:
+            while True:
+                headers, resumption_token = parse_list_identifiers(call_with_retries(fetch_page, endpoint, params))
+                changed = []
+                for identifier, datestamp, deleted in headers:
+                    if deleted:
+                        manifest.discard(identifier)
+                    elif not manifest.is_current(identifier, datestamp):
+                        changed.append((identifier, datestamp))
+
+                page = RecordPage()
+                for (identifier, datestamp), record in zip(changed, executor.map(get_record, changed)):
+                    if record is not None:
+                        page.append(record)
+                    fetched[identifier] = datestamp
+                pbar.update(len(headers))
+                yield page
+
+                if resumption_token is None:
+                    return
+                params = {
+                    "verb": "ListIdentifiers",
+                    "resumptionToken": resumption_token
+                }
+
+    harvested = save_record_pages(changed_pages(), changes_file, field_map=field_map)
+    if merging:
+        if harvested:
+            merge_csv_records(csv_output_file, changes_file)
+        os.remove(changes_file)
+    manifest.update(fetched)
+    manifest.save()
+    return harvested
+
+def fetch_list_sets(endpoint):
+    """
+    Fetch the sets exposed by an endpoint, following ListSets resumption tokens.
+
+    Args:
+        endpoint (str): The OAI-PMH endpoint URL.
+
+    Returns:
+        list: A list of (setSpec, setName) tuples.
+    """
+    sets = []
+    params = {"verb": "ListSets"}
+    while True:
+        page_sets, resumption_token = parse_list_sets(call_with_retries(fetch_page, endpoint, params))
+        sets.extend(page_sets)
+        if resumption_token is None:
+            return sets
+        params = {"verb": "ListSets", "resumptionToken": resumption_token}
+
+def estimate_set_size(endpoint, set_name=None, metadata_prefix="pico", from_date=None, until_date=None):
+    """
+    Estimate the number of records of a set from the first page of its ListIdentifiers response.
+
+    Args:
+        endpoint (str): The OAI-PMH endpoint URL.
+        set_name (str, optional): The set (setSpec).
+        metadata_prefix (str, optional): The metadata prefix (default: "pico").
+        from_date (str, optional): Only count records changed on or after this OAI datestamp.
+        until_date (str, optional): Only count records changed on or before this OAI datestamp.
+
+    Returns:
+        int: The `completeListSize` announced by the repository (the number of
+        headers if the list fits in one page, 0 for an empty set), or None if the
+        repository announces no size.
+    """
+    params = {
+        "verb": "ListIdentifiers",
+        "metadataPrefix": metadata_prefix
+    }
+    if set_name:
+        params["set"] = set_name
+    if from_date:
+        params["from"] = from_date
+    if until_date:
+        params["until"] = until_date
+    headers, resumption_token = parse_list_identifiers(call_with_retries(fetch_page, endpoint, params))
+    if resumption_token is None:
+        return len(headers)
+    return resumption_token.complete_list_size
+
+def estimate_set_sizes(endpoint, set_names, metadata_prefix="pico", max_workers=DEFAULT_PER_ENDPOINT_LIMIT,
+                       from_date=None, until_date=None):
+    """
+    Estimate the size of many sets concurrently (see `estimate_set_size`).
+
+    Returns:
+        dict: The estimated number of records per set; None where unknown or when the estimate failed.
+    """
+    def estimate(set_name):
+        try:
+            return estimate_set_size(endpoint, set_name, metadata_prefix, from_date, until_date)
+        except Exception as e:
+            print(f"Warning: cannot estimate the size of set '{set_name}': {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(set_names, executor.map(estimate, set_names)))
+
+def _endpoint_semaphore(endpoint, limit):
+    """
+    Return the semaphore bounding concurrent harvests against one endpoint host.
+
+    Semaphores are shared by every harvest of the process with the same host and
+    limit, so a later batch asking for a different limit gets its own instead of
+    silently keeping the first one.
+    """
+    key = (urlparse(endpoint).netloc, limit)
+    with _endpoint_semaphores_lock:
+        if key not in _endpoint_semaphores:
+            _endpoint_semaphores[key] = threading.BoundedSemaphore(limit)
+        return _endpoint_semaphores[key]
+
+def harvest_set(endpoint, set_name, output_dir, metadata_prefix="pico", save_csv=True, save_xml=False,
+                test_limit=None, prefetch=False, per_endpoint_limit=DEFAULT_PER_ENDPOINT_LIMIT, resume=False,
+                state_file=None, shard_rows=None, save_parquet=False, from_date=None, until_date=None,
+                granularity=DAY_GRANULARITY, state_store=None):
+    """
+    Harvest one set into its own output files, named after the set.
+
+    Harvests are checkpointed to `<set>.checkpoint.json` after every page.
+    With a `state_file`, the CSV output is refreshed incrementally (see `harvest_incremental`).
+
+    Args:
+        endpoint (str): The OAI-PMH endpoint URL.
+        set_name (str): The set (setSpec) to harvest.
+        output_dir (str): The directory to write the output files to.
+        metadata_prefix (str, optional): The metadata prefix (default: "pico").
+        save_csv (bool, optional): Write `<set>.csv`.
+        save_xml (bool, optional): Write `<set>.xml`.
+        test_limit (int, optional): Limit the number of records fetched for testing purposes.
+        prefetch (bool, optional): Download the next page while the current one is processed.
+        per_endpoint_limit (int, optional): Maximum concurrent harvests against the endpoint host.
+        resume (bool, optional): Continue from the set's checkpoint if one exists.
+        state_file (str, optional): Harvest incrementally, using this harvest state file.
+        shard_rows (int, optional): Rotate the CSV output into shards of this many rows.
+        save_parquet (bool, optional): Write `<set>.parquet`.
+        from_date (str, optional): Only harvest records changed on or after this OAI datestamp.
+        until_date (str, optional): Only harvest records changed on or before this OAI datestamp.
+        granularity (str, optional): The datestamp granularity supported by the endpoint, for incremental harvests.
+        state_store (HarvestStateStore, optional): The store of `state_file`, shared by the sets of a batch.
+
+    Returns:
+        int: The number of records written.
+    """
+    base_name = os.path.join(output_dir, re.sub(r'[^\w.-]', '_', set_name))
+    csv_output_file = f"{base_name}.csv" if save_csv else None
+    xml_output_file = f"{base_name}.xml" if save_xml else None
+    parquet_output_file = f"{base_name}.parquet" if save_parquet else None
+    checkpoint_file = checkpoint_path(f"{base_name}.csv")
+    with _endpoint_semaphore(endpoint, per_endpoint_limit):
+        if resume and os.path.exists(checkpoint_file):
+            return resume_harvest(checkpoint_file, prefetch)
+        if state_file and save_csv:
+            return harvest_incremental(endpoint, set_name, csv_output_file, state_file, metadata_prefix,
+                                       granularity, prefetch, state_store)
+        checkpoint = HarvestCheckpoint(checkpoint_file, endpoint, set_name, metadata_prefix)
+        pages = iter_record_pages(endpoint, set_name, metadata_prefix, test_limit, prefetch,
+                                  from_date=from_date, until_date=until_date)
+        return save_record_pages(pages, csv_output_file, xml_output_file, checkpoint, shard_rows, parquet_output_file)
+
+def harvest_sets(endpoint, set_names, output_dir, metadata_prefix="pico", save_csv=True, save_xml=False,
+                 test_limit=None, prefetch=False, max_workers=DEFAULT_MAX_WORKERS,
+                 per_endpoint_limit=DEFAULT_PER_ENDPOINT_LIMIT, resume=False, state_file=None, shard_rows=None,
+                 save_parquet=False, plan=False, from_date=None, until_date=None, granularity=DAY_GRANULARITY):
+    """
+    Harvest many sets concurrently, writing one output per set.
+
+    Sets are distributed over a bounded worker pool; on top of that, no more than
+    `per_endpoint_limit` sets are harvested at the same time from one host, so a
+    batch never overloads a single provider. A failing set is reported and does
+    not stop the others.
+
+    With `plan`, the size of every set is estimated up front from its first
+    ListIdentifiers page: empty sets are skipped without creating any output,
+    the largest sets are started first so they do not end up running alone at
+    the end of the batch, and the pool is not made larger than the number of
+    sets left.
+
+    Args:
+        endpoint (str): The OAI-PMH endpoint URL.
+        set_names (list): The sets (setSpec) to harvest.
+        output_dir (str): The directory to write the output files to.
+        metadata_prefix (str, optional): The metadata prefix (default: "pico").
+        save_csv (bool, optional): Write one CSV file per set.
+        save_xml (bool, optional): Write one XML file per set.
+        test_limit (int, optional): Limit the number of records fetched per set.
+        prefetch (bool, optional): Download the next page while the current one is processed.
+        max_workers (int, optional): Size of the worker pool.
+        per_endpoint_limit (int, optional): Maximum concurrent harvests per endpoint host.
+        resume (bool, optional): Continue each set from its checkpoint if one exists.
+        state_file (str, optional): Harvest every set incrementally, using this harvest state file.
+        shard_rows (int, optional): Rotate each CSV output into shards of this many rows.
+        save_parquet (bool, optional): Write one Parquet file per set.
+        plan (bool, optional): Estimate set sizes first to skip empty sets and schedule the largest first.
+        from_date (str, optional): Only harvest records changed on or after this OAI datestamp.
+        until_date (str, optional): Only harvest records changed on or before this OAI datestamp.
+        granularity (str, optional): The datestamp granularity supported by the endpoint, for incremental harvests.
+
+    Returns:
+        dict: The number of records written per set; failed sets are mapped to the exception raised.
+    """
+    results = {}
+    if plan:
+        sizes = estimate_set_sizes(endpoint, set_names, metadata_prefix, per_endpoint_limit, from_date, until_date)
+        empty = [set_name for set_name in set_names if sizes[set_name] == 0]
+        results.update((set_name, 0) for set_name in empty)
+        # Largest first; sets of unknown size may be large, so they go first too
+        set_names = sorted((set_name for set_name in set_names if sizes[set_name] != 0),
+                           key=lambda set_name: -sizes[set_name] if sizes[set_name] is not None else float("-inf"))
+        announced = sum(sizes[set_name] or 0 for set_name in set_names)
+        print(f"Planned {len(set_names)} sets ({announced} records announced), skipping {len(empty)} empty sets.")
+        max_workers = max(1, min(max_workers, len(set_names)))
+
+    # Every worker (and its prefetch thread) needs its own pooled connection
+    configure_session(pool_size=max(DEFAULT_POOL_SIZE, max_workers * 2))
+    # One store for every set, so concurrent sets do not overwrite each other's entries
+    state_store = HarvestStateStore(state_file) if state_file and save_csv else None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(harvest_set, endpoint, set_name, output_dir, metadata_prefix, save_csv, save_xml,
+                            test_limit, prefetch, per_endpoint_limit, resume, state_file, shard_rows,
+                            save_parquet, from_date, until_date, granularity, state_store): set_name
+            for set_name in set_names
+        }
+        for future in as_completed(futures):
+            set_name = futures[future]
+            try:
+                results[set_name] = future.result()
+            except Exception as e:
+                print(f"Error harvesting set '{set_name}': {e}")
+                results[set_name] = e
+    return results
 
 def main():
     print("Welcome to the OAI-PMH Records Fetcher Wizard!")
@@ -225,6 +858,14 @@ def main():
     # Step 3: Enter the dataset name (optional)
     dataset_name = input("\nStep 3: Enter the dataset name (optional, press Enter to skip): ").strip() or None
 
+    # Step 3b: Batch mode, harvesting every set listed in a ListSets response
+    list_sets_file = None
+    if verb == "ListRecords" and dataset_name is None:
+        list_sets_file = input("Harvest all sets from a ListSets XML file? (path, press Enter to skip): ").strip() or None
+        if list_sets_file and not os.path.exists(list_sets_file):
+            print(f"File '{list_sets_file}' does not exist. Exiting.")
+            sys.exit(1)
+
     # Step 4: Enter the directory path for saving the output
     output_dir = input("\nStep 4: Enter the directory path to save the output (default: current directory): ").strip() or "."
     if not os.path.exists(output_dir):
@@ -240,17 +881,27 @@ def main():
     # Step 7: Choose output formats
     save_xml = input("\nStep 7: Save as XML? (y/n, default: 'n'): ").strip().lower() == "y"
     save_csv = input("Save as CSV? (y/n, default: 'n'): ").strip().lower() == "y"
+    save_parquet = input("Save as Parquet? (y/n, default: 'n'): ").strip().lower() == "y"
+
+    # Step 8: Incremental harvesting, only available for a single set saved as CSV
+    incremental = False
+    if verb == "ListRecords" and save_csv and not save_xml and not save_parquet and not list_sets_file and not test_mode:
+        incremental = input("\nStep 8: Only fetch records changed since the last harvest? (y/n, default: 'n'): ").strip().lower() == "y"
 
     # Confirm the selections
     print("\nSummary of your selections:")
     print(f"  Endpoint: {endpoint}")
     print(f"  Verb: {verb}")
     print(f"  Dataset Name: {dataset_name}")
+    if list_sets_file:
+        print(f"  Sets From: {list_sets_file}")
     print(f"  Output Directory: {output_dir}")
     print(f"  Output File: {output_file}")
     print(f"  Test Mode: {'Enabled' if test_mode else 'Disabled'}")
     print(f"  Save as XML: {'Yes' if save_xml else 'No'}")
     print(f"  Save as CSV: {'Yes' if save_csv else 'No'}")
+    print(f"  Save as Parquet: {'Yes' if save_parquet else 'No'}")
+    print(f"  Incremental: {'Yes' if incremental else 'No'}")
 
     confirm = input("\nDo you want to proceed? (y/n, default: 'y'): ").strip().lower() or "y"
     if confirm != "y":
@@ -259,25 +910,321 @@ def main():
 
     # Fetch records or perform the requested OAI-PMH operation
     print(f"\nFetching data from endpoint: {endpoint} with verb: {verb}")
-    if verb == "ListRecords":
-        records = fetch_records(endpoint, verb, set_name=dataset_name, test_limit=20 if test_mode else None)
+    if verb == "ListRecords" and list_sets_file:
+        with open(list_sets_file, mode='rb') as file:
+            set_names = [set_spec for set_spec, _ in parse_list_sets(file.read())[0]]
+        print(f"Harvesting {len(set_names)} sets into {output_dir}")
+        results = harvest_sets(endpoint, set_names, output_dir, save_csv=save_csv, save_xml=save_xml,
+                               test_limit=20 if test_mode else None, save_parquet=save_parquet)
+        failed = [set_name for set_name, result in results.items() if isinstance(result, Exception)]
+        if failed:
+            print(f"\n{len(failed)} of {len(set_names)} sets failed: {', '.join(failed)}")
+            sys.exit(1)
+    elif verb == "ListRecords" and incremental:
+        csv_output_file = os.path.join(output_dir, output_file if output_file.endswith(".csv") else f"{output_file}.csv")
+        state_file = os.path.join(output_dir, HARVEST_STATE_FILE)
+        try:
+            harvested = harvest_incremental(endpoint, dataset_name, csv_output_file, state_file)
+        except Exception as e:
+            print(f"Error during fetching data: {e}")
+            sys.exit(1)
+        print(f"Merged {harvested} new or changed records into {csv_output_file}")
+    elif verb == "ListRecords":
+        pages = iter_record_pages(endpoint, set_name=dataset_name, test_limit=20 if test_mode else None)
+        xml_output_file = None
+        csv_output_file = None
         if save_xml:
             xml_output_file = os.path.join(output_dir, output_file if output_file.endswith(".xml") else f"{output_file}.xml")
             print(f"Saving records as XML to {xml_output_file}")
-            save_to_xml(records, xml_output_file)
         if save_csv:
             csv_output_file = os.path.join(output_dir, output_file if output_file.endswith(".csv") else f"{output_file}.csv")
             print(f"Saving records as CSV to {csv_output_file}")
-            save_to_csv(records, csv_output_file)
+        parquet_output_file = None
+        if save_parquet:
+            parquet_output_file = os.path.join(output_dir, output_file if output_file.endswith(".parquet") else f"{output_file}.parquet")
+            print(f"Saving records as Parquet to {parquet_output_file}")
+        checkpoint = None
+        if save_csv or save_xml or save_parquet:
+            checkpoint = HarvestCheckpoint(checkpoint_path(csv_output_file or xml_output_file or parquet_output_file),
+                                           endpoint, dataset_name, "pico")
+        try:
+            save_record_pages(pages, csv_output_file, xml_output_file, checkpoint, parquet_output_file=parquet_output_file)
+        except Exception as e:
+            print(f"Error during fetching data: {e}")
+            if checkpoint is not None and checkpoint.pages:
+                # Parquet is only written on close, so a partial Parquet output cannot be resumed
+                if save_parquet:
+                    print("The Parquet output cannot be resumed; restart the harvest.")
+                else:
+                    print(f"Progress saved. Resume with: python {os.path.basename(__file__)} --resume {checkpoint.path}")
+            sys.exit(1)
+    elif save_xml:
+        # For other verbs, stream the raw XML responses to disk
+        xml_output_file = os.path.join(output_dir, output_file if output_file.endswith(".xml") else f"{output_file}.xml")
+        print(f"Saving raw output as XML to {xml_output_file}")
+        try:
+            files = save_raw_output(endpoint, verb, xml_output_file, set_name=dataset_name)
+        except Exception as e:
+            print(f"Error during fetching data: {e}")
+            sys.exit(1)
+        if len(files) > 1:
+            print(f"Saved {len(files)} pages: {files[0]} ... {files[-1]}")
     else:
-        # For other verbs, fetch raw XML output
-        raw_output = fetch_records(endpoint, verb, set_name=dataset_name)
-        if save_xml:
-            xml_output_file = os.path.join(output_dir, output_file if output_file.endswith(".xml") else f"{output_file}.xml")
-            print(f"Saving raw output as XML to {xml_output_file}")
-            save_raw_output(raw_output, xml_output_file)
+        print(fetch_records(endpoint, verb, set_name=dataset_name))
 
     print("\nOperation completed successfully.")
 
+def build_arg_parser():
+    """
+    Build the command-line interface of the records fetcher.
+
+    Returns:
+        argparse.ArgumentParser: The argument parser.
+    """
+    parser = argparse.ArgumentParser(
+        description="Fetch records from an OAI-PMH endpoint. Without arguments, runs the interactive wizard.")
+
+    source = parser.add_argument_group("request")
+    source.add_argument("-e", "--endpoint", default="a",
+                        help=f"Endpoint key ({', '.join(ENDPOINTS)}) or OAI-PMH URL (default: 'a').")
+    source.add_argument("-v", "--verb", default="ListRecords",
+                        help="OAI-PMH verb, by name or by its wizard number (default: ListRecords).")
+    source.add_argument("-s", "--set", dest="sets", action="append", metavar="SET",
+                        help="Set to harvest; repeat to harvest several sets in parallel.")
+    source.add_argument("--sets-from", metavar="FILE", nargs="+", action="extend",
+                        help="Harvest every set listed in saved ListSets XML files (e.g. the pages saved by -v ListSets --xml).")
+    source.add_argument("--all-sets", action="store_true", help="Harvest every set returned by the endpoint's ListSets.")
+    source.add_argument("-p", "--metadata-prefix",
+                        help="Metadata prefix (default: pico, or the prefix of --field-map).")
+    source.add_argument("--field-map", metavar="FILE",
+                        help="JSON field map (metadata prefix, namespaces, path per column) for prefixes "
+                             "without a built-in map (built-in: pico, oai_dc).")
+    source.add_argument("--from", dest="from_date", metavar="DATE", help="Only harvest records changed on or after DATE.")
+    source.add_argument("--until", dest="until_date", metavar="DATE", help="Only harvest records changed on or before DATE.")
+
+    output = parser.add_argument_group("output")
+    output.add_argument("-o", "--output-dir", default=".", help="Directory to save the output to (default: current directory).")
+    output.add_argument("-n", "--output-name", default="output",
+                        help="Output file name for a single set (default: 'output'); batch outputs are named after their set.")
+    output.add_argument("--csv", action="store_true", help="Save records as CSV (the default if no format is given).")
+    output.add_argument("--parquet", action="store_true", help="Save records as Parquet, one row group per page (needs pyarrow).")
+    output.add_argument("--xml", action="store_true",
+                        help="Save records as XML; for other verbs, stream the raw responses to disk "
+                             "(ListIdentifiers and ListSets one file per page).")
+    output.add_argument("--limit", type=int, metavar="N", help="Stop after N records per set (test mode).")
+    output.add_argument("--shard-rows", type=int, metavar="N",
+                        help="Rotate CSV output into numbered shards of N rows (<name>-00000.csv, ...).")
+
+    harvest = parser.add_argument_group("harvesting")
+    harvest.add_argument("--workers", type=int,
+                         help=f"Sets harvested in parallel (default: {DEFAULT_MAX_WORKERS}).")
+    harvest.add_argument("--per-endpoint", type=int, default=DEFAULT_PER_ENDPOINT_LIMIT,
+                         help=f"Concurrent harvests against one host (default: {DEFAULT_PER_ENDPOINT_LIMIT}).")
+    harvest.add_argument("--prefetch", action="store_true", help="Download the next page while the current one is processed.")
+    harvest.add_argument("--plan", action="store_true",
+                         help="Estimate set sizes from ListIdentifiers first: skip empty sets and start the largest first.")
+    harvest.add_argument("--async", dest="use_async", action="store_true",
+                         help="Harvest all sets as coroutines on one event loop, --per-endpoint requests at a time "
+                              "per host (uses httpx if installed).")
+    harvest.add_argument("--resume", nargs="?", const=True, metavar="CHECKPOINT",
+                         help="Resume from a checkpoint file, or from the checkpoints next to the outputs if no file is given "
+                              "(a resumed harvest keeps the --from/--until/--limit of the run that started it).")
+    harvest.add_argument("--by-identifiers", action="store_true",
+                         help="List identifiers first and fetch only new or changed records with --workers concurrent "
+                              "GetRecord calls, merging them into the CSV output.")
+    harvest.add_argument("--incremental", action="store_true",
+                         help="Only fetch records changed since the last successful harvest and merge them into the CSV output.")
+    harvest.add_argument("--state-file", help=f"Harvest state file for --incremental (default: OUTPUT_DIR/{HARVEST_STATE_FILE}).")
+    harvest.add_argument("--granularity", choices=[DAY_GRANULARITY, SECONDS_GRANULARITY], default=DAY_GRANULARITY,
+                         help="Datestamp granularity supported by the endpoint, for --incremental.")
+
+    harvest.add_argument("--metrics", metavar="REPORT",
+                         help="Time every page (network wait, bytes, parse, extraction, write) and write a JSON report.")
+    harvest.add_argument("--live-metrics", action="store_true",
+                         help="Show throughput and the share of time per phase on the progress bar.")
+
+    network = parser.add_argument_group("network")
+    network.add_argument("--timeout", type=float, help="Read timeout in seconds.")
+    network.add_argument("--retries", type=int, help="Retries of a failed page before giving up.")
+    network.add_argument("--rate-limit", type=float, metavar="RPS", help="Maximum requests per second to the endpoint.")
+    network.add_argument("--cache-dir", help="Cache raw responses in this directory.")
+    network.add_argument("--cache-max-mb", type=int, help="Size cap of the response cache in megabytes.")
+    network.add_argument("--cache-ttl", type=float, metavar="SECONDS", help="Lifetime of cached responses.")
+    network.add_argument("--offline", action="store_true", help="Replay responses from --cache-dir without using the network.")
+    return parser
+
+def run_cli(args):
+    """
+    Run the records fetcher non-interactively.
+
+    Args:
+        args (argparse.Namespace): The parsed command-line arguments.
+    """
+    endpoint = ENDPOINTS.get(args.endpoint, args.endpoint)
+    verb = VERBS.get(args.verb, args.verb)
+    if verb not in VERBS.values():
+        print(f"Invalid verb '{args.verb}'. Choose one of: {', '.join(VERBS.values())}.")
+        sys.exit(1)
+    if args.offline and not args.cache_dir:
+        print("--offline requires --cache-dir.")
+        sys.exit(1)
+    save_csv = args.csv or not (args.xml or args.parquet)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    metadata_prefix = args.metadata_prefix or "pico"
+    if args.field_map:
+        try:
+            field_map = load_field_map(args.field_map)
+        except (OSError, ValueError, KeyError, SyntaxError) as e:
+            print(f"Invalid field map '{args.field_map}': {e}")
+            sys.exit(1)
+        if args.metadata_prefix and args.metadata_prefix != field_map.metadata_prefix:
+            print(f"The field map is for metadata prefix '{field_map.metadata_prefix}', not '{args.metadata_prefix}'.")
+            sys.exit(1)
+        register_field_map(field_map)
+        metadata_prefix = field_map.metadata_prefix
+    if verb == "ListRecords" and not isinstance(args.resume, str):
+        try:
+            get_field_map(metadata_prefix)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+
+    if args.timeout is not None:
+        configure_session(timeout=(DEFAULT_TIMEOUT[0], args.timeout))
+    if args.retries is not None:
+        configure_retries(max_retries=args.retries)
+    if args.rate_limit:
+        set_rate_limit(endpoint, args.rate_limit)
+    if args.cache_dir:
+        max_bytes = args.cache_max_mb * 1024 ** 2 if args.cache_max_mb else DEFAULT_CACHE_MAX_BYTES
+        configure_cache(ResponseCache(args.cache_dir, max_bytes, args.cache_ttl, args.offline))
+    metrics = None
+    if args.metrics or args.live_metrics:
+        metrics = HarvestMetrics()
+        configure_metrics(metrics, live=args.live_metrics)
+
+    try:
+        if isinstance(args.resume, str):
+            if args.from_date or args.until_date or args.limit:
+                print("--from/--until/--limit cannot be changed when resuming a checkpoint: "
+                      "its resumption token continues the original request.")
+                sys.exit(1)
+            total = resume_harvest(args.resume, prefetch=args.prefetch)
+            print(f"\nHarvest completed: {total} records.")
+            return
+
+        if verb != "ListRecords":
+            set_name = args.sets[0] if args.sets else None
+            if args.xml:
+                xml_output_file = os.path.join(args.output_dir, args.output_name if args.output_name.endswith(".xml") else f"{args.output_name}.xml")
+                files = save_raw_output(endpoint, verb, xml_output_file, set_name, metadata_prefix)
+                print(f"Raw output saved to {files[0]}" if len(files) == 1 else
+                      f"Raw output saved to {len(files)} pages: {files[0]} ... {files[-1]}")
+            else:
+                print(fetch_records(endpoint, verb, set_name=set_name, metadata_prefix=metadata_prefix))
+            return
+
+        if args.by_identifiers and (not save_csv or args.xml or args.parquet or args.shard_rows or args.incremental
+                                    or args.use_async):
+            print("--by-identifiers only supports unsharded CSV output, without --incremental or --async.")
+            sys.exit(1)
+        if args.limit and (args.incremental or args.by_identifiers):
+            print("--limit is not supported with --incremental or --by-identifiers.")
+            sys.exit(1)
+        if (args.from_date or args.until_date) and args.incremental:
+            print("--from/--until are not supported with --incremental, which starts from the last harvest.")
+            sys.exit(1)
+
+        state_file = None
+        if args.incremental and args.use_async:
+            print("--incremental is not supported with --async.")
+            sys.exit(1)
+        if args.use_async and (args.plan or args.prefetch or args.workers is not None):
+            print("--plan, --prefetch and --workers are not supported with --async, "
+                  "which bounds its requests with --per-endpoint.")
+            sys.exit(1)
+        workers = args.workers if args.workers is not None else DEFAULT_MAX_WORKERS
+        if args.incremental:
+            if not save_csv or args.xml or args.parquet or args.shard_rows:
+                print("--incremental only supports unsharded CSV output.")
+                sys.exit(1)
+            state_file = args.state_file or os.path.join(args.output_dir, HARVEST_STATE_FILE)
+
+        set_names = list(args.sets or [])
+        for list_sets_file in args.sets_from or []:
+            with open(list_sets_file, mode='rb') as file:
+                set_names.extend(set_spec for set_spec, _ in parse_list_sets(file.read())[0])
+        if args.all_sets:
+            set_names.extend(set_spec for set_spec, _ in fetch_list_sets(endpoint))
+
+        if args.use_async:
+            jobs = [HarvestJob(endpoint, set_name, metadata_prefix, args.from_date, args.until_date)
+                    for set_name in set_names or [None]]
+            timeout = (DEFAULT_TIMEOUT[0], args.timeout) if args.timeout is not None else DEFAULT_TIMEOUT
+            print(f"Harvesting {len(jobs)} sets from {endpoint} into {args.output_dir} (async)")
+            results = asyncio.run(harvest_async(jobs, args.output_dir, save_csv, args.xml, args.parquet, args.limit,
+                                                args.per_endpoint, resume=bool(args.resume),
+                                                shard_rows=args.shard_rows, timeout=timeout))
+            failed = [name for name, result in results.items() if isinstance(result, Exception)]
+            print(f"\nHarvested {len(jobs) - len(failed)} of {len(jobs)} sets.")
+            if failed:
+                print(f"Failed sets: {', '.join(failed)}")
+                sys.exit(1)
+            return
+
+        if args.by_identifiers and (len(set_names) > 1 or args.sets_from or args.all_sets):
+            print("--by-identifiers harvests a single set.")
+            sys.exit(1)
+        if len(set_names) > 1 or args.sets_from or args.all_sets:
+            print(f"Harvesting {len(set_names)} sets from {endpoint} into {args.output_dir}")
+            results = harvest_sets(endpoint, set_names, args.output_dir, metadata_prefix, save_csv, args.xml,
+                                   args.limit, args.prefetch, workers, args.per_endpoint,
+                                   bool(args.resume), state_file, args.shard_rows, args.parquet, args.plan,
+                                   args.from_date, args.until_date, args.granularity)
+            failed = [set_name for set_name, result in results.items() if isinstance(result, Exception)]
+            print(f"\nHarvested {len(set_names) - len(failed)} of {len(set_names)} sets.")
+            if failed:
+                print(f"Failed sets: {', '.join(failed)}")
+                sys.exit(1)
+            return
+
+        set_name = set_names[0] if set_names else None
+        base_name = os.path.join(args.output_dir, os.path.splitext(args.output_name)[0])
+        csv_output_file = f"{base_name}.csv" if save_csv else None
+        xml_output_file = f"{base_name}.xml" if args.xml else None
+        parquet_output_file = f"{base_name}.parquet" if args.parquet else None
+        checkpoint_file = checkpoint_path(f"{base_name}.csv")
+
+        if args.by_identifiers:
+            total = harvest_by_identifiers(endpoint, set_name, csv_output_file, metadata_prefix, workers,
+                                           args.from_date, args.until_date)
+        elif args.incremental:
+            total = harvest_incremental(endpoint, set_name, csv_output_file, state_file, metadata_prefix,
+                                        args.granularity, args.prefetch)
+        elif args.resume and os.path.exists(checkpoint_file):
+            total = resume_harvest(checkpoint_file, args.prefetch)
+        else:
+            checkpoint = HarvestCheckpoint(checkpoint_file, endpoint, set_name, metadata_prefix)
+            pages = iter_record_pages(endpoint, set_name, metadata_prefix, args.limit, args.prefetch,
+                                      from_date=args.from_date, until_date=args.until_date)
+            total = save_record_pages(pages, csv_output_file, xml_output_file, checkpoint, args.shard_rows,
+                                      parquet_output_file)
+        print(f"\nHarvest completed: {total} records.")
+    except Exception as e:
+        print(f"Error during fetching data: {e}")
+        sys.exit(1)
+    finally:
+        if metrics is not None:
+            report = metrics.write_report(args.metrics) if args.metrics else metrics.report()
+            if report["bound"]:
+                shares = ", ".join(f"{phase} {share:.0%}" for phase, share in report["shares"].items())
+                print(f"Time per phase: {shares} ({report['bound']}-bound, {report['records_per_second']:.0f} records/s)")
+            if args.metrics:
+                print(f"Metrics report saved to {args.metrics}")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if len(sys.argv) > 1:
+        run_cli(build_arg_parser().parse_args())
+    else:
+        main()
@@ -0,0 +1,275 @@
+import argparse
+import gzip
+import random
+import sys
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+# Synthetic sets served when none are given: set name -> number of records
+DEFAULT_SETS = {"mock_a": 1000, "mock_b": 500}
+
+# Records per ListRecords / ListIdentifiers page
+DEFAULT_PAGE_SIZE = 100
+
+# Words the synthetic descriptions are drawn from
+WORDS = ("chiesa affresco altare navata campanile facciata portale cappella dipinto scultura tela legno marmo "
+         "bronzo secolo restauro collezione museo archivio documento fotografia reperto scavo anfora moneta "
+         "ceramica villa palazzo castello torre ponte giardino").split()
+
+OAI_HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">'
+              '<responseDate>2024-01-01T00:00:00Z</responseDate>')
+
+def _record_metadata(set_name, index):
+    """
+    Build the PICO metadata of a synthetic record; the same index always gives the same record.
+    """
+    rng = random.Random(f"{set_name}:{index}")
+    title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))).capitalize()
+    description = " ".join(rng.choice(WORDS) for _ in range(rng.randint(15, 80))).capitalize() + "."
+    types = "".join(f"<dc:type>{escape(rng.choice(WORDS))}</dc:type>" for _ in range(rng.randint(1, 2)))
+    subjects = "".join(f"<dc:subject>{escape(rng.choice(WORDS))}</dc:subject>" for _ in range(rng.randint(1, 4)))
+    return ('<metadata><pico:record xmlns:pico="http://purl.org/pico/1.0/" '
+            'xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            f'<dc:identifier>{set_name}-{index}</dc:identifier>'
+            f'<dc:title>{escape(title)}</dc:title>'
+            f'<dc:description>{escape(description)}</dc:description>'
+            f'{types}{subjects}</pico:record></metadata>')
+
+def _header(set_name, index):
+    return (f'<header><identifier>oai:mock:{set_name}:{index}</identifier>'
+            f'<datestamp>2024-01-01</datestamp><setSpec>{set_name}</setSpec></header>')
+
+def _error(code, message):
+    return f'{OAI_HEADER}<error code="{code}">{escape(message)}</error></OAI-PMH>'.encode("utf-8")
+
+class MockOAIServer:
+    """
+    A local OAI-PMH provider serving synthetic PICO records, for tests and benchmarks.
+
+    Supports Identify, ListMetadataFormats, ListSets, ListIdentifiers,
+    ListRecords and GetRecord. List responses are split into pages of
+    `page_size` items linked by resumption tokens carrying `completeListSize`
+    and `cursor`. Responses can be delayed by a fixed latency, compressed with
+    gzip when the client asks for it, and replaced at random by a 503 answer
+    (with `Retry-After: 0`) to exercise the harvester's retries.
+
+    Use it as a context manager, or call `start()` and `stop()`:
+
+        with MockOAIServer(sets={"demo": 5000}, latency=0.05) as server:
+            harvest(server.url)
+
+    Args:
+        host (str, optional): The address to listen on.
+        port (int, optional): The port to listen on; 0 picks a free port.
+        sets (dict, optional): The number of records of each set (default: DEFAULT_SETS).
+        page_size (int, optional): The number of items per list page.
+        latency (float, optional): The delay in seconds before every response.
+        error_rate (float, optional): The probability of answering a request with HTTP 503.
+        compress (bool, optional): Gzip responses for clients sending `Accept-Encoding: gzip`.
+        seed (int, optional): The seed of the error injection.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, sets=None, page_size=DEFAULT_PAGE_SIZE, latency=0.0,
+                 error_rate=0.0, compress=True, seed=0):
+        self.sets = dict(sets or DEFAULT_SETS)
+        self.page_size = page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.compress = compress
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._page = lru_cache(maxsize=256)(self._build_page)
+
+    @property
+    def url(self):
+        """
+        The OAI-PMH endpoint URL of the server.
+        """
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/oai"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are sent separately; without this, keep-alive requests stall on delayed ACKs
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                params = {name: values[0] for name, values in parse_qs(urlparse(self.path).query).items()}
+                status, body = server.respond(params)
+                headers = {"Content-Type": "text/xml; charset=utf-8"}
+                if status == 503:
+                    headers["Retry-After"] = "0"
+                elif server.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+                    body = gzip.compress(body, compresslevel=1)
+                    headers["Content-Encoding"] = "gzip"
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def respond(self, params):
+        """
+        Answer an OAI-PMH request.
+
+        Args:
+            params (dict): The query parameters.
+
+        Returns:
+            tuple: The HTTP status and the response body.
+        """
+        with self._lock:
+            self.requests += 1
+            failed = self.error_rate and self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if failed:
+            return 503, b"Service temporarily unavailable"
+
+        verb = params.get("verb")
+        if verb == "Identify":
+            return 200, (f'{OAI_HEADER}<Identify><repositoryName>Mock OAI-PMH provider</repositoryName>'
+                         '<protocolVersion>2.0</protocolVersion><granularity>YYYY-MM-DD</granularity>'
+                         '</Identify></OAI-PMH>').encode("utf-8")
+        if verb == "ListMetadataFormats":
+            return 200, (f'{OAI_HEADER}<ListMetadataFormats><metadataFormat><metadataPrefix>pico'
+                         '</metadataPrefix><metadataNamespace>http://purl.org/pico/1.0/</metadataNamespace>'
+                         '</metadataFormat></ListMetadataFormats></OAI-PMH>').encode("utf-8")
+        if verb == "ListSets":
+            sets = "".join(f"<set><setSpec>{escape(name)}</setSpec><setName>{escape(name)}</setName></set>"
+                           for name in self.sets)
+            return 200, f"{OAI_HEADER}<ListSets>{sets}</ListSets></OAI-PMH>".encode("utf-8")
+        if verb == "GetRecord":
+            try:
+                _, _, set_name, index = params.get("identifier", "").split(":")
+                index = int(index)
+            except ValueError:
+                return 200, _error("idDoesNotExist", "Unknown identifier")
+            if not 0 <= index < self.sets.get(set_name, 0):
+                return 200, _error("idDoesNotExist", "Unknown identifier")
+            return 200, (f"{OAI_HEADER}<GetRecord><record>{_header(set_name, index)}"
+                         f"{_record_metadata(set_name, index)}</record></GetRecord></OAI-PMH>").encode("utf-8")
+        if verb in ("ListRecords", "ListIdentifiers"):
+            if "resumptionToken" in params:
+                try:
+                    set_name, cursor = params["resumptionToken"].rsplit(":", 1)
+                    cursor = int(cursor)
+                except ValueError:
+                    return 200, _error("badResumptionToken", "Invalid resumption token")
+            else:
+                if params.get("metadataPrefix") != "pico":
+                    return 200, _error("cannotDisseminateFormat", "Only pico is supported")
+                set_name, cursor = params.get("set", next(iter(self.sets))), 0
+            if set_name not in self.sets:
+                return 200, _error("badArgument", f"Unknown set {set_name}")
+            if self.sets[set_name] == 0:
+                return 200, _error("noRecordsMatch", "The set is empty")
+            return 200, self._page(verb, set_name, cursor)
+        return 200, _error("badVerb", "Illegal OAI verb")
+
+    def _build_page(self, verb, set_name, cursor):
+        size = self.sets[set_name]
+        end = min(cursor + self.page_size, size)
+        if verb == "ListRecords":
+            items = "".join(f"<record>{_header(set_name, index)}{_record_metadata(set_name, index)}</record>"
+                            for index in range(cursor, end))
+        else:
+            items = "".join(_header(set_name, index) for index in range(cursor, end))
+        token = f"{set_name}:{end}" if end < size else ""
+        return (f'{OAI_HEADER}<{verb}>{items}<resumptionToken completeListSize="{size}" cursor="{cursor}">'
+                f'{token}</resumptionToken></{verb}></OAI-PMH>').encode("utf-8")
+
+    def serve_forever(self):
+        """
+        Serve requests on the current thread until interrupted.
+        """
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._httpd.server_close()
+
+    def start(self):
+        """
+        Serve requests on a background thread.
+        """
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving and release the port.
+        """
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+def parse_set_sizes(values):
+    """
+    Parse "name:size" command-line arguments.
+
+    Returns:
+        dict: The number of records of each set.
+    """
+    sets = {}
+    for value in values:
+        name, _, size = value.rpartition(":")
+        if not name or not size.isdigit():
+            raise argparse.ArgumentTypeError(f"Invalid set '{value}', expected NAME:SIZE.")
+        sets[name] = int(size)
+    return sets
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic PICO records over OAI-PMH.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on (default: 8080).")
+    parser.add_argument("--sets", nargs="+", metavar="NAME:SIZE",
+                        help=f"Sets and their number of records (default: {' '.join(f'{name}:{size}' for name, size in DEFAULT_SETS.items())}).")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help=f"Records per page (default: {DEFAULT_PAGE_SIZE}).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay in seconds before every response.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of answering with HTTP 503.")
+    parser.add_argument("--no-gzip", action="store_true", help="Never compress responses.")
+    args = parser.parse_args()
+
+    try:
+        sets = parse_set_sizes(args.sets) if args.sets else None
+    except argparse.ArgumentTypeError as e:
+        print(e)
+        sys.exit(1)
+    server = MockOAIServer(args.host, args.port, sets, args.page_size, args.latency, args.error_rate,
+                           not args.no_gzip)
+    print(f"Serving {len(server.sets)} sets at {server.url} (Ctrl+C to stop)")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
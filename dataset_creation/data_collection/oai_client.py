@@ -0,0 +1,448 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+from response_cache import CachedPage
+
+# Connect and read timeouts (in seconds) applied to every OAI-PMH request
+DEFAULT_TIMEOUT = (10, 120)
+
+# Maximum number of pooled keep-alive connections kept per host
+DEFAULT_POOL_SIZE = 10
+
+# Headers sent with every OAI-PMH request
+DEFAULT_HEADERS = {
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+    "User-Agent": "dataset_utils OAI-PMH harvester",
+}
+
+# Retry policy: attempts after the first one, and the exponential backoff bounds (in seconds)
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_MAX = 120.0
+
+# Longest Retry-After honoured (in seconds); a server asking for more fails the request instead
+DEFAULT_RETRY_AFTER_MAX = 3600.0
+
+# HTTP statuses and OAI-PMH error codes that are worth retrying
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRY_OAI_CODES = {"badResumptionToken"}
+
+# Matches an OAI-PMH <error> element; such responses are never cached
+OAI_ERROR_PATTERN = re.compile(rb'<(?:[\w.-]+:)?error[\s>]')
+
+class OAIError(Exception):
+    """
+    Raised when an OAI-PMH request cannot be completed.
+
+    Args:
+        message (str): The error message.
+        status (int, optional): The HTTP status code of the response.
+        code (str, optional): The OAI-PMH error code (e.g. "badResumptionToken").
+        retry_after (float, optional): The delay in seconds requested by the server.
+    """
+
+    def __init__(self, message, status=None, code=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        return self.status in RETRY_STATUS_CODES or self.code in RETRY_OAI_CODES
+
+class RateLimiter:
+    """
+    Space out the requests sent to one host.
+
+    Args:
+        requests_per_second (float, optional): The maximum request rate, or None for no limit.
+    """
+
+    def __init__(self, requests_per_second=None):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._next_request = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Claim the next request slot to the host without waiting for it.
+
+        Returns:
+            float: The delay in seconds before the request may be sent.
+        """
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self._next_request - now)
+            self._next_request = max(now, self._next_request) + self.interval
+        return delay
+
+    def wait(self):
+        """
+        Block until the next request to the host is allowed.
+        """
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        """
+        Hold back every request to the host for the given number of seconds.
+        """
+        with self._lock:
+            self._next_request = max(self._next_request, time.monotonic() + seconds)
+
+_session = None
+_session_lock = threading.Lock()
+_timeout = DEFAULT_TIMEOUT
+_max_retries = DEFAULT_MAX_RETRIES
+_backoff_base = DEFAULT_BACKOFF_BASE
+_backoff_max = DEFAULT_BACKOFF_MAX
+_retry_after_max = DEFAULT_RETRY_AFTER_MAX
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+_cache = None
+
+def create_session(pool_size=DEFAULT_POOL_SIZE):
+    """
+    Create an HTTP session with connection pooling, keep-alive and compression.
+
+    Args:
+        pool_size (int, optional): Maximum number of pooled connections per host.
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+def configure_session(pool_size=None, timeout=None):
+    """
+    Reconfigure the shared session used by all OAI-PMH requests.
+
+    Args:
+        pool_size (int, optional): Maximum number of pooled connections per host.
+        timeout (float or tuple, optional): Timeout in seconds, or a (connect, read) tuple.
+    """
+    global _session, _timeout
+    with _session_lock:
+        if timeout is not None:
+            _timeout = timeout
+        if pool_size is not None:
+            if _session is not None:
+                _session.close()
+            _session = create_session(pool_size)
+
+def configure_retries(max_retries=None, backoff_base=None, backoff_max=None, retry_after_max=None):
+    """
+    Reconfigure the retry policy applied to OAI-PMH requests.
+
+    Args:
+        max_retries (int, optional): Number of retries after the first attempt.
+        backoff_base (float, optional): Delay in seconds before the first retry.
+        backoff_max (float, optional): Upper bound in seconds of a single backoff delay.
+        retry_after_max (float, optional): Longest Retry-After delay honoured; a
+            longer one makes the request fail instead of being retried early.
+    """
+    global _max_retries, _backoff_base, _backoff_max, _retry_after_max
+    if max_retries is not None:
+        _max_retries = max_retries
+    if backoff_base is not None:
+        _backoff_base = backoff_base
+    if backoff_max is not None:
+        _backoff_max = backoff_max
+    if retry_after_max is not None:
+        _retry_after_max = retry_after_max
+
+def configure_cache(cache):
+    """
+    Serve OAI-PMH pages from a response cache.
+
+    Args:
+        cache (ResponseCache): The cache to use, or None to disable caching.
+    """
+    global _cache
+    _cache = cache
+
+def get_cache():
+    """
+    Return the configured response cache, or None.
+    """
+    return _cache
+
+def get_rate_limiter(endpoint):
+    """
+    Return the rate limiter shared by all requests to the endpoint's host.
+    """
+    host = urlparse(endpoint).netloc
+    with _rate_limiters_lock:
+        if host not in _rate_limiters:
+            _rate_limiters[host] = RateLimiter()
+        return _rate_limiters[host]
+
+def set_rate_limit(endpoint, requests_per_second):
+    """
+    Limit the request rate to the endpoint's host.
+
+    Args:
+        endpoint (str): An endpoint URL on the host.
+        requests_per_second (float): The maximum request rate, or None for no limit.
+    """
+    host = urlparse(endpoint).netloc
+    with _rate_limiters_lock:
+        _rate_limiters[host] = RateLimiter(requests_per_second)
+
+def get_session():
+    """
+    Return the shared session, creating it on first use.
+
+    The session is shared by every verb and endpoint, so consecutive
+    resumption-token pages reuse the same TCP/TLS connection.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+def oai_get(endpoint, params, stream=False):
+    """
+    Send an OAI-PMH GET request through the shared session.
+
+    Args:
+        endpoint (str): The OAI-PMH endpoint URL.
+        params (dict): The query parameters (verb, set, resumptionToken, ...).
+        stream (bool, optional): Defer downloading the body until it is read.
+
+    Returns:
+        requests.Response: The HTTP response.
+    """
+    get_rate_limiter(endpoint).wait()
+    return get_session().get(endpoint, params=params, timeout=_timeout, stream=stream)
+
+def parse_retry_after(response):
+    """
+    Read the Retry-After header of a response.
+
+    Args:
+        response (requests.Response): The HTTP response.
+
+    Returns:
+        float: The requested delay in seconds, or None if absent or invalid.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _http_error(response):
+    """
+    Build the OAIError describing a non-200 response.
+    """
+    return OAIError(f"Unable to fetch data. HTTP Status Code: {response.status_code}",
+                    status=response.status_code, retry_after=parse_retry_after(response))
+
+def is_retryable(error):
+    """
+    Tell whether a failed request is worth retrying.
+
+    Connection resets, timeouts, truncated bodies, throttling/unavailable
+    statuses and retryable OAI-PMH error codes are considered transient.
+
+    Args:
+        error (Exception): The exception raised by the request.
+
+    Returns:
+        bool: True if the request should be retried.
+    """
+    if isinstance(error, OAIError):
+        return error.retryable
+    return isinstance(error, (
+        requests.ConnectionError,
+        requests.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+        urllib3.exceptions.HTTPError,
+        ConnectionError,
+    ))
+
+def should_retry(attempt, error):
+    """
+    Decide whether a failed request is retried after `attempt` retries.
+
+    A Retry-After longer than the configured ceiling is not retried: retrying
+    sooner than the server asked would only spend attempts on more refusals.
+    """
+    if attempt >= _max_retries or not is_retryable(error):
+        return False
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None and retry_after > _retry_after_max:
+        print(f"Warning: the server asked to retry in {retry_after:.0f}s, more than the "
+              f"{_retry_after_max:.0f}s allowed; giving up.")
+        return False
+    return True
+
+def retry_delay(attempt, retry_after=None):
+    """
+    Compute the delay before a retry.
+
+    A server-provided Retry-After is honoured in full (`should_retry` refuses
+    the ones above the Retry-After ceiling); otherwise the delay is drawn
+    uniformly between zero and an exponentially growing cap bounded by the
+    backoff maximum ("full jitter"), so parallel workers do not retry in lockstep.
+
+    Args:
+        attempt (int): The number of retries already made.
+        retry_after (float, optional): The delay requested by the server.
+
+    Returns:
+        float: The delay in seconds.
+    """
+    if retry_after is not None:
+        return retry_after
+    return random.uniform(0, min(_backoff_max, _backoff_base * 2 ** attempt))
+
+def call_with_retries(func, endpoint, *args, **kwargs):
+    """
+    Call `func(endpoint, *args, **kwargs)`, retrying transient failures.
+
+    While a Retry-After delay is pending, every request to the same host is held
+    back, not only the one that was throttled.
+
+    Args:
+        func (callable): The request function; its first argument is the endpoint.
+        endpoint (str): The OAI-PMH endpoint URL.
+
+    Returns:
+        The return value of `func`.
+    """
+    attempt = 0
+    while True:
+        try:
+            return func(endpoint, *args, **kwargs)
+        except Exception as e:
+            if not should_retry(attempt, e):
+                raise
+            retry_after = getattr(e, "retry_after", None)
+            delay = retry_delay(attempt, retry_after)
+            if retry_after is not None:
+                get_rate_limiter(endpoint).pause(delay)
+            attempt += 1
+            print(f"Warning: {str(e).rstrip('.')}. Retrying in {delay:.1f}s (attempt {attempt}/{_max_retries}).")
+            time.sleep(delay)
+
+async def call_with_retries_async(func, endpoint, *args, **kwargs):
+    """
+    Await `func(endpoint, *args, **kwargs)`, retrying transient failures.
+
+    The asynchronous counterpart of `call_with_retries`, with the same policy;
+    delays are awaited, so other harvests on the event loop keep running.
+
+    Args:
+        func (coroutine function): The request function; its first argument is the endpoint.
+        endpoint (str): The OAI-PMH endpoint URL.
+
+    Returns:
+        The return value of `func`.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await func(endpoint, *args, **kwargs)
+        except Exception as e:
+            if not should_retry(attempt, e):
+                raise
+            retry_after = getattr(e, "retry_after", None)
+            delay = retry_delay(attempt, retry_after)
+            if retry_after is not None:
+                get_rate_limiter(endpoint).pause(delay)
+            attempt += 1
+            print(f"Warning: {str(e).rstrip('.')}. Retrying in {delay:.1f}s (attempt {attempt}/{_max_retries}).")
+            await asyncio.sleep(delay)
+
+def fetch_page(endpoint, params):
+    """
+    Download a complete OAI-PMH response body.
+
+    Args:
+        endpoint (str): The OAI-PMH endpoint URL.
+        params (dict): The query parameters.
+
+    Returns:
+        bytes: The (decompressed) response body.
+
+    When a response cache is configured, cached pages are returned without a
+    request and successful responses are stored in the cache.
+
+    Raises:
+        OAIError: If the endpoint does not answer with HTTP 200, or the page is
+            missing from an offline cache.
+    """
+    if _cache is not None:
+        content = _cache.get(endpoint, params)
+        if content is not None:
+            return content
+        if _cache.offline:
+            raise OAIError(f"Page not in cache (offline mode): {params}")
+
+    response = oai_get(endpoint, params)
+    if response.status_code != 200:
+        raise _http_error(response)
+    content = response.content
+    if _cache is not None and not OAI_ERROR_PATTERN.search(content):
+        _cache.put(endpoint, params, content)
+    return content
+
+def open_page(endpoint, params):
+    """
+    Open an OAI-PMH response for streaming.
+
+    The body of the returned response can be read incrementally from
+    `response.raw`, which transparently decompresses gzip/deflate content.
+    The caller is responsible for closing the response. With a response cache
+    configured, the page is read through `fetch_page` and served from memory.
+
+    Args:
+        endpoint (str): The OAI-PMH endpoint URL.
+        params (dict): The query parameters.
+
+    Returns:
+        requests.Response: The streaming response.
+
+    Raises:
+        OAIError: If the endpoint does not answer with HTTP 200.
+    """
+    if _cache is not None:
+        return CachedPage(fetch_page(endpoint, params))
+
+    response = oai_get(endpoint, params, stream=True)
+    if response.status_code != 200:
+        error = _http_error(response)
+        response.close()
+        raise error
+    response.raw.decode_content = True
+    return response
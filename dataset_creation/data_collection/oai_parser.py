@@ -0,0 +1,450 @@
+import json
+import re
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import unescape
+
+from oai_client import OAIError
+
+# Namespaces used by CulturaItalia OAI-PMH responses
+NAMESPACES = {
+    'oai': 'http://www.openarchives.org/OAI/2.0/',
+    'dc': 'http://purl.org/dc/elements/1.1/',
+    'pico': 'http://purl.org/pico/1.0/',
+    'oai_dc': 'http://www.openarchives.org/OAI/2.0/oai_dc/'
+}
+
+# Fully qualified tags, resolved once so the parser compares plain strings
+OAI_RECORD = f"{{{NAMESPACES['oai']}}}record"
+OAI_METADATA = f"{{{NAMESPACES['oai']}}}metadata"
+OAI_LIST_RECORDS = f"{{{NAMESPACES['oai']}}}ListRecords"
+OAI_RESUMPTION_TOKEN = f"{{{NAMESPACES['oai']}}}resumptionToken"
+OAI_ERROR = f"{{{NAMESPACES['oai']}}}error"
+OAI_HEADER = f"{{{NAMESPACES['oai']}}}header"
+OAI_IDENTIFIER = f"{{{NAMESPACES['oai']}}}identifier"
+OAI_DATESTAMP = f"{{{NAMESPACES['oai']}}}datestamp"
+
+# A field path naming a single (optionally prefixed) child element, collected without XPath
+CHILD_PATH_PATTERN = re.compile(r'(?:[\w.-]+:)?[\w.-]+')
+
+# Matches a (possibly prefixed) resumptionToken element in raw response bytes
+RESUMPTION_TOKEN_PATTERN = re.compile(
+    rb'<(?:[\w.-]+:)?resumptionToken\b([^>]*?)(?:/>|>([^<]*)</(?:[\w.-]+:)?resumptionToken\s*>)'
+)
+
+# Matches the attributes of a start tag in raw response bytes
+ATTRIBUTE_PATTERN = re.compile(rb'([\w.:-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+# Matches the code and message of an OAI-PMH error element in raw response bytes
+OAI_ERROR_ELEMENT_PATTERN = re.compile(
+    rb'<(?:[\w.-]+:)?error\b[^>]*?\bcode\s*=\s*["\']([^"\']*)["\'][^>]*?(?:/>|>([^<]*))'
+)
+
+# XML declarations and xml-stylesheet instructions; saved ListSets dumps may contain several
+XML_DECLARATION_PATTERN = re.compile(rb'<\?xml[^>]*\?>')
+
+# OAI-PMH places the resumptionToken at the end of the list, so scan the tail first
+RESUMPTION_TOKEN_TAIL = 8192
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+class ResumptionToken(str):
+    """
+    A resumption token, carrying the list size information of its element.
+
+    Behaves as the token string itself, so it can be sent back to the endpoint
+    and stored in checkpoints unchanged. Repositories may omit any attribute.
+
+    Args:
+        value (str): The token.
+        complete_list_size (int, optional): The `completeListSize` attribute: the size of the whole list.
+        cursor (int, optional): The `cursor` attribute: the number of items returned before
+            the page carrying the token.
+        expiration_date (str, optional): The `expirationDate` attribute.
+    """
+
+    def __new__(cls, value, complete_list_size=None, cursor=None, expiration_date=None):
+        token = super().__new__(cls, value)
+        token.complete_list_size = _int_or_none(complete_list_size)
+        token.cursor = _int_or_none(cursor)
+        token.expiration_date = expiration_date
+        return token
+
+    @classmethod
+    def from_element(cls, elem):
+        """
+        Build the token of a `resumptionToken` element.
+
+        Returns:
+            ResumptionToken: The token, or None if the element is empty (the last page).
+        """
+        if not elem.text or not elem.text.strip():
+            return None
+        return cls(elem.text.strip(), elem.get("completeListSize"), elem.get("cursor"), elem.get("expirationDate"))
+
+# Marks a single-valued field not seen yet in the record being extracted
+_MISSING = object()
+
+class FieldMap:
+    """
+    Declarative mapping of one metadata format onto output columns.
+
+    Each field maps an output column to a path relative to the metadata root
+    element (the child of `oai:metadata`), written with the prefixes of
+    `namespaces`. The map is compiled once: paths naming a direct child (e.g.
+    "dc:title") are resolved to qualified tags and collected in a single pass
+    over the root's children, so the cost per record does not grow with the
+    number of fields. Any other ElementTree XPath expression (e.g.
+    "dc:creator/foaf:name" or "dc:date[@type='created']") is evaluated with
+    `findall`.
+
+    Args:
+        metadata_prefix (str): The metadata prefix the map applies to.
+        root (str): The tag of the metadata root element, e.g. "pico:record".
+        fields (list): (column, path, multiple) tuples, in output order. Multiple
+            fields collect every match as a list; the others keep the first match.
+        namespaces (dict, optional): Additional namespace prefixes used by `root` and the paths.
+    """
+
+    def __init__(self, metadata_prefix, root, fields, namespaces=None):
+        self.metadata_prefix = metadata_prefix
+        self.root = root
+        self.fields = [(column, path, bool(multiple)) for column, path, multiple in fields]
+        self.namespaces = {**NAMESPACES, **(namespaces or {})}
+        self.columns = [column for column, _, _ in self.fields]
+        self.multi_valued = [column for column, _, multiple in self.fields if multiple]
+
+        self._root_tag = self._qualify(root)
+        self._children = {}
+        self._paths = []
+        for index, (column, path, multiple) in enumerate(self.fields):
+            if CHILD_PATH_PATTERN.fullmatch(path):
+                self._children.setdefault(self._qualify(path), []).append((index, multiple))
+            else:
+                # Fail on a bad expression now rather than on the first record
+                ET.Element("root").findall(path, self.namespaces)
+                self._paths.append((index, path, multiple))
+
+    def _qualify(self, name):
+        """
+        Turn a "prefix:local" name into a fully qualified tag.
+        """
+        if ':' not in name:
+            return name
+        prefix, local = name.split(':', 1)
+        if prefix not in self.namespaces:
+            raise ValueError(f"Unknown namespace prefix '{prefix}' in the field map of '{self.metadata_prefix}'.")
+        return f"{{{self.namespaces[prefix]}}}{local}"
+
+    def extract(self, record):
+        """
+        Extract the mapped fields of a record.
+
+        Args:
+            record (xml.etree.ElementTree.Element): An `oai:record` element.
+
+        Returns:
+            dict: The extracted record, or None if the record has no metadata in
+            this format (e.g. a deleted record). Missing fields are empty strings
+            (empty lists for multiple fields).
+        """
+        metadata = record.find(OAI_METADATA)
+        if metadata is None:
+            return None
+        root = metadata.find(self._root_tag)
+        if root is None:
+            return None
+
+        values = [[] if multiple else _MISSING for _, _, multiple in self.fields]
+        children = self._children
+        for child in root:
+            targets = children.get(child.tag)
+            if targets is None:
+                continue
+            for index, multiple in targets:
+                if multiple:
+                    values[index].append(child.text or "")
+                elif values[index] is _MISSING:
+                    values[index] = child.text
+        for index, path, multiple in self._paths:
+            matches = root.findall(path, self.namespaces)
+            if multiple:
+                values[index] = [match.text or "" for match in matches]
+            elif matches:
+                values[index] = matches[0].text
+
+        return {column: "" if value is _MISSING else value for column, value in zip(self.columns, values)}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a field map from its JSON representation.
+
+        Args:
+            data (dict): A document with "metadata_prefix", "root", "fields" (a list
+                of {"column", "path", "multiple"} objects) and optional "namespaces".
+
+        Returns:
+            FieldMap: The compiled field map.
+        """
+        fields = [(field["column"], field["path"], field.get("multiple", False)) for field in data["fields"]]
+        return cls(data["metadata_prefix"], data["root"], fields, data.get("namespaces"))
+
+# Dublin Core fields harvested from CulturaItalia records
+DC_FIELDS = [
+    ("identifier", "dc:identifier", False),
+    ("title", "dc:title", False),
+    ("description", "dc:description", False),
+    ("type", "dc:type", True),
+    ("subject", "dc:subject", True),
+]
+
+# Built-in field maps; oai_dc is supported by every OAI-PMH repository
+PICO_FIELD_MAP = FieldMap("pico", "pico:record", DC_FIELDS)
+OAI_DC_FIELD_MAP = FieldMap("oai_dc", "oai_dc:dc", DC_FIELDS)
+
+_field_maps = {field_map.metadata_prefix: field_map for field_map in (PICO_FIELD_MAP, OAI_DC_FIELD_MAP)}
+
+def load_field_map(path):
+    """
+    Load a field map from a JSON file (see `FieldMap.from_dict` for the format).
+
+    Args:
+        path (str): The JSON file.
+
+    Returns:
+        FieldMap: The compiled field map.
+    """
+    with open(path, mode='r', encoding='utf-8') as file:
+        return FieldMap.from_dict(json.load(file))
+
+def register_field_map(field_map):
+    """
+    Use a field map for its metadata prefix, replacing any map registered before.
+
+    Args:
+        field_map (FieldMap): The field map.
+    """
+    _field_maps[field_map.metadata_prefix] = field_map
+
+def get_field_map(metadata_prefix):
+    """
+    Return the field map registered for a metadata prefix.
+
+    Args:
+        metadata_prefix (str): The metadata prefix.
+
+    Returns:
+        FieldMap: The field map.
+
+    Raises:
+        ValueError: If no field map is registered for the prefix.
+    """
+    try:
+        return _field_maps[metadata_prefix]
+    except KeyError:
+        raise ValueError(f"No field map for metadata prefix '{metadata_prefix}'; "
+                         f"available: {', '.join(_field_maps)}. Provide one with --field-map.") from None
+
+def extract_pico_record(record):
+    """
+    Extract the Dublin Core fields of a PICO record.
+
+    Args:
+        record (xml.etree.ElementTree.Element): An `oai:record` element.
+
+    Returns:
+        dict: The extracted record, or None if the record has no PICO metadata.
+        Repeated `dc:type` and `dc:subject` values are kept as lists.
+    """
+    return PICO_FIELD_MAP.extract(record)
+
+def iterparse_records(source, field_map=None):
+    """
+    Incrementally parse a ListRecords response, yielding records as they are read.
+
+    Each `oai:record` element is discarded as soon as it has been extracted, so
+    memory stays bounded by a single record rather than the whole page. When
+    `source` is a network stream, parsing starts before the body has finished
+    downloading.
+
+    Use it with `yield from` to also obtain the resumption token:
+
+        token = yield from iterparse_records(response.raw)
+
+    Args:
+        source (file-like or str): A binary file-like object or a file path.
+        field_map (FieldMap, optional): The fields to extract (default: PICO).
+
+    Yields:
+        dict: A record extracted from the page.
+
+    Returns:
+        ResumptionToken: The resumption token of the next page, or None if this is the last page.
+
+    Raises:
+        OAIError: If the response carries an OAI-PMH error other than noRecordsMatch.
+    """
+    extract = (field_map or PICO_FIELD_MAP).extract
+    resumption_token = None
+    container = None
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if elem.tag == OAI_LIST_RECORDS:
+                container = elem
+            continue
+
+        if elem.tag == OAI_RECORD:
+            record = extract(elem)
+            # Drop every record parsed so far from the tree
+            if container is not None:
+                container.clear()
+            else:
+                elem.clear()
+            if record is not None:
+                yield record
+        elif elem.tag == OAI_RESUMPTION_TOKEN:
+            resumption_token = ResumptionToken.from_element(elem)
+        elif elem.tag == OAI_ERROR:
+            code = elem.get("code")
+            # An empty set (or an empty incremental window) is not an error
+            if code != "noRecordsMatch":
+                raise OAIError(f"OAI-PMH error {code}: {(elem.text or '').strip()}", code=code)
+    return resumption_token
+
+def read_page(source, limit=None, field_map=None):
+    """
+    Parse one ListRecords page into a list of records.
+
+    Args:
+        source (file-like): The response body.
+        limit (int, optional): Stop after this many records.
+        field_map (FieldMap, optional): The fields to extract (default: PICO).
+
+    Returns:
+        tuple: The records, the resumption token of the next page (or None) and
+        whether parsing stopped early because of `limit`.
+    """
+    page = []
+    records = iterparse_records(source, field_map)
+    while True:
+        try:
+            page.append(next(records))
+        except StopIteration as stop:
+            return page, stop.value, False
+        if limit is not None and len(page) >= limit:
+            records.close()
+            return page, None, True
+
+def find_resumption_token(content):
+    """
+    Locate the resumption token in a raw response body without parsing it.
+
+    This is a cheap scan of the end of the page, used to request the next page
+    before the current one has been parsed.
+
+    Args:
+        content (bytes): The raw response body.
+
+    Returns:
+        ResumptionToken: The resumption token, or None if the page has none.
+    """
+    match = RESUMPTION_TOKEN_PATTERN.search(content, max(0, len(content) - RESUMPTION_TOKEN_TAIL))
+    if match is None:
+        match = RESUMPTION_TOKEN_PATTERN.search(content)
+    if match is None or not match.group(2) or not match.group(2).strip():
+        return None
+    attributes = {
+        name.decode("utf-8"): unescape((double or single).decode("utf-8"))
+        for name, double, single in ATTRIBUTE_PATTERN.findall(match.group(1))
+    }
+    return ResumptionToken(unescape(match.group(2).decode("utf-8").strip()), attributes.get("completeListSize"),
+                           attributes.get("cursor"), attributes.get("expirationDate"))
+
+def find_oai_error(content):
+    """
+    Locate an OAI-PMH error in a raw response body without parsing it.
+
+    Error responses are short, so scanning the last few kilobytes of a body is enough.
+
+    Args:
+        content (bytes): The raw response body, or its tail.
+
+    Returns:
+        tuple: The error code and message, or None if the response carries no error.
+    """
+    match = OAI_ERROR_ELEMENT_PATTERN.search(content)
+    if match is None:
+        return None
+    return match.group(1).decode("utf-8"), unescape((match.group(2) or b"").decode("utf-8").strip())
+
+def parse_list_identifiers(content):
+    """
+    Parse a ListIdentifiers response into its record headers.
+
+    Args:
+        content (bytes): The raw ListIdentifiers response.
+
+    Returns:
+        tuple: A list of (identifier, datestamp, deleted) tuples and the resumption token (or None).
+
+    Raises:
+        OAIError: If the response carries an OAI-PMH error other than noRecordsMatch.
+    """
+    root = ET.fromstring(content)
+    headers = []
+    resumption_token = None
+    for elem in root.iter():
+        if elem.tag == OAI_HEADER:
+            identifier = elem.findtext(OAI_IDENTIFIER, "").strip()
+            datestamp = elem.findtext(OAI_DATESTAMP, "").strip()
+            if identifier:
+                headers.append((identifier, datestamp, elem.get("status") == "deleted"))
+        elif elem.tag == OAI_RESUMPTION_TOKEN:
+            resumption_token = ResumptionToken.from_element(elem)
+        elif elem.tag == OAI_ERROR:
+            code = elem.get("code")
+            if code != "noRecordsMatch":
+                raise OAIError(f"OAI-PMH error {code}: {(elem.text or '').strip()}", code=code)
+    return headers, resumption_token
+
+def _local_name(tag):
+    """
+    Strip the namespace from an element tag.
+    """
+    return tag.rsplit('}', 1)[-1]
+
+def parse_list_sets(content):
+    """
+    Parse a ListSets response into its set specs and names.
+
+    Namespaces are ignored, so both live responses and the namespace-stripped
+    dumps saved under `ListSets/` are accepted.
+
+    Args:
+        content (bytes): The raw ListSets response.
+
+    Returns:
+        tuple: A list of (setSpec, setName) tuples and the resumption token (or None).
+    """
+    root = ET.fromstring(XML_DECLARATION_PATTERN.sub(b'', content))
+    sets = []
+    resumption_token = None
+    for elem in root.iter():
+        name = _local_name(elem.tag)
+        if name == "set":
+            spec = set_name = None
+            for child in elem:
+                child_name = _local_name(child.tag)
+                if child_name == "setSpec":
+                    spec = (child.text or "").strip()
+                elif child_name == "setName":
+                    set_name = (child.text or "").strip()
+            if spec:
+                sets.append((spec, set_name))
+        elif name == "resumptionToken":
+            resumption_token = ResumptionToken.from_element(elem)
+    return sets, resumption_token
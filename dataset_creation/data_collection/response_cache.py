@@ -0,0 +1,159 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+# Default cache size cap, in bytes of compressed pages
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# Request parameters that identify a page; anything else is ignored by the key
+KEY_PARAMS = ("verb", "set", "metadataPrefix", "resumptionToken", "from", "until", "identifier")
+
+class CachedPage:
+    """
+    A cached response body exposed like a streaming `requests.Response`.
+
+    Args:
+        content (bytes): The response body.
+    """
+
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+        self.raw = io.BytesIO(content)
+
+    def close(self):
+        self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class ResponseCache:
+    """
+    On-disk cache of raw OAI-PMH responses, keyed by endpoint and request parameters.
+
+    Pages are stored gzip-compressed, one file per request. When the cache grows
+    past `max_bytes`, the least recently used pages are evicted; pages older than
+    `ttl` seconds are treated as missing. In offline mode the cache is used as a
+    replay source: misses raise instead of going to the network, so parsing
+    experiments and benchmarks are deterministic.
+
+    Args:
+        directory (str): The cache directory; it is created if needed.
+        max_bytes (int, optional): The size cap of the cache.
+        ttl (float, optional): The lifetime of a page in seconds, or None to keep pages until evicted.
+        offline (bool, optional): Never fetch pages that are not cached.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, ttl=None, offline=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.offline = offline
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in self._entries())
+
+    @staticmethod
+    def key(endpoint, params):
+        """
+        Compute the cache key of a request.
+
+        Args:
+            endpoint (str): The OAI-PMH endpoint URL.
+            params (dict): The query parameters.
+
+        Returns:
+            str: A hex digest identifying the request.
+        """
+        identity = [endpoint] + [[name, params[name]] for name in KEY_PARAMS if params.get(name) is not None]
+        return hashlib.sha256(json.dumps(identity).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.xml.gz")
+
+    def _entries(self):
+        for shard in os.scandir(self.directory):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    if entry.name.endswith(".xml.gz"):
+                        yield entry
+
+    def get(self, endpoint, params):
+        """
+        Return the cached body of a request.
+
+        Args:
+            endpoint (str): The OAI-PMH endpoint URL.
+            params (dict): The query parameters.
+
+        Returns:
+            bytes: The response body, or None on a miss.
+        """
+        path = self._path(self.key(endpoint, params))
+        try:
+            stat = os.stat(path)
+            if self.ttl is not None and time.time() - stat.st_mtime > self.ttl:
+                return None
+            with gzip.open(path, mode='rb') as file:
+                content = file.read()
+            # The access time tracks recency for LRU eviction, the modification time the page's age
+            os.utime(path, (time.time(), stat.st_mtime))
+            return content
+        except FileNotFoundError:
+            return None
+
+    def put(self, endpoint, params, content):
+        """
+        Store the body of a request, evicting old pages if the cache is full.
+
+        Args:
+            endpoint (str): The OAI-PMH endpoint URL.
+            params (dict): The query parameters.
+            content (bytes): The response body.
+        """
+        path = self._path(self.key(endpoint, params))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, mode='wb', compresslevel=6) as file:
+            file.write(content)
+        size = os.path.getsize(tmp_path)
+        with self._lock:
+            if os.path.exists(path):
+                self._size -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """
+        Remove least recently used pages until the cache is back under 90% of its cap.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_atime)
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if self._size <= target:
+                break
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            self._size -= size
+
+    def clear(self):
+        """
+        Remove every cached page.
+        """
+        with self._lock:
+            for entry in list(self._entries()):
+                os.remove(entry.path)
+            self._size = 0
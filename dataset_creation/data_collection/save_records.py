@@ -1,55 +1,401 @@
-import xml.etree.ElementTree as ET
-from xml.dom.minidom import parseString
+from xml.sax.saxutils import XMLGenerator, quoteattr
 import csv
 import sys
 import os
 
-def save_to_xml(records, output_file, stylesheet=None):
+# Parquet output is optional and needs pyarrow
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+from oai_parser import PICO_FIELD_MAP
+
+# Fields holding a list of values (repeated dc:type / dc:subject elements)
+MULTI_VALUED_FIELDS = ["type", "subject"]
+
+# CSV has no list type, so list values are joined with this separator
+CSV_LIST_SEPARATOR = "; "
+
+class CSVRecordWriter:
     """
-    Save records to an XML file with an optional XSL stylesheet.
+    Incrementally write harvested records to a CSV file, one page at a time.
+
+    Every page is flushed as soon as it is written, so the output can be read
+    while a long harvest is still running. List values are joined with "; ". With `shard_rows`, the output is
+    rotated into shards of at most that many rows, named `<name>-00000.csv`,
+    `<name>-00001.csv`, ..., each with its own header.
+
+    Args:
+        output_file (str): The file to save the CSV output to.
+        fieldnames (list): The CSV columns, in order.
+        resume_from (dict, optional): A `position()` returned by a previous writer:
+            its shard is truncated back to the recorded size and appended to
+            without writing the header again.
+        shard_rows (int, optional): Rotate to a new shard after this many rows.
     """
-    try:
-        root = ET.Element("ListRecords")
+
+    def __init__(self, output_file, fieldnames, resume_from=None, shard_rows=None):
+        self.output_file = output_file
+        self.fieldnames = fieldnames
+        self.shard_rows = shard_rows
+        self.rows_written = 0
+        self.shard = 0
+        self.shard_rows_written = 0
+        self._file = None
+        if resume_from is None:
+            self._open()
+        else:
+            self.shard = resume_from["shard"]
+            self.shard_rows_written = resume_from["rows"]
+            self._open(resume_from["offset"])
+
+    def shard_path(self, shard):
+        """
+        Return the path of a shard (the output file itself when not sharding).
+        """
+        if not self.shard_rows:
+            return self.output_file
+        root, ext = os.path.splitext(self.output_file)
+        return f"{root}-{shard:05d}{ext}"
+
+    def _open(self, offset=None):
+        path = self.shard_path(self.shard)
+        if offset is None:
+            self._file = open(path, mode='w', newline='', encoding='utf-8')
+            self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames)
+            self._writer.writeheader()
+        else:
+            with open(path, mode='r+b') as file:
+                file.truncate(offset)
+            self._file = open(path, mode='a', newline='', encoding='utf-8')
+            self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames)
+
+    def _rotate(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self.shard += 1
+        self.shard_rows_written = 0
+        self._open()
+
+    def write_page(self, records):
+        """
+        Append a page (any iterable) of records to the output and flush it.
+        """
+        for record in records:
+            if self.shard_rows and self.shard_rows_written >= self.shard_rows:
+                self._rotate()
+            self._writer.writerow({
+                key: CSV_LIST_SEPARATOR.join(value) if isinstance(value, list) else value
+                for key, value in record.items()
+            })
+            self.rows_written += 1
+            self.shard_rows_written += 1
+        self._file.flush()
+
+    def position(self):
+        """
+        Sync the written rows to disk and return where the output ends.
+
+        Returns:
+            dict: The current shard, its size in bytes and its number of rows,
+            usable as `resume_from`.
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {"shard": self.shard, "offset": self._file.buffer.tell(), "rows": self.shard_rows_written}
+
+    def close(self):
+        """
+        Flush and close the underlying file.
+        """
+        if not self._file.closed:
+            self._file.close()
+
+class XMLRecordWriter:
+    """
+    Incrementally write harvested records to an indented XML file, one page at a time.
+
+    The XML declaration, the optional stylesheet instruction and the opening
+    `<ListRecords>` tag are written up front; each record is then serialised
+    straight to the file as it arrives, and the root is closed by `close()`.
+    List values (multi-valued `type` and `subject`) become repeated elements.
+
+    Args:
+        output_file (str): The file to save the XML output to.
+        stylesheet (str, optional): The path to an XSL stylesheet to reference from the XML.
+        resume_from (dict, optional): A `position()` returned by a previous writer:
+            the file is truncated back to it and appended to.
+    """
+
+    def __init__(self, output_file, stylesheet=None, resume_from=None):
+        self.output_file = output_file
+        self.rows_written = 0
+        if resume_from is None:
+            self._file = open(output_file, mode='w', encoding='utf-8')
+            self._file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+            if stylesheet:
+                self._file.write(f'<?xml-stylesheet type="text/xsl" href={quoteattr(stylesheet)}?>\n')
+            self._file.write('<ListRecords>\n')
+        else:
+            with open(output_file, mode='r+b') as file:
+                file.truncate(resume_from["offset"])
+            self._file = open(output_file, mode='a', encoding='utf-8')
+        self._xml = XMLGenerator(self._file, encoding='utf-8', short_empty_elements=True)
+
+    def _element(self, tag, text):
+        self._file.write('    ')
+        self._xml.startElement(tag, {})
+        if text:
+            self._xml.characters(text)
+        self._xml.endElement(tag)
+        self._file.write('\n')
+
+    def write_page(self, records):
+        """
+        Append a page (any iterable) of records to the output and flush it.
+        """
         for record in records:
-            record_elem = ET.SubElement(root, "record")
+            self._file.write('  <record>\n')
             for key, value in record.items():
-                if key in ["type", "subject"] and value:
-                    for item in value.split("; "):
-                        child = ET.SubElement(record_elem, key)
-                        child.text = item
+                if isinstance(value, list):
+                    for item in value:
+                        self._element(key, item)
                 else:
-                    child = ET.SubElement(record_elem, key)
-                    child.text = value
-
-        # Convert the XML tree to a string
-        cleaned_xml = ET.tostring(root, encoding="unicode")
-        dom = parseString(cleaned_xml)
-        pretty_xml = dom.toprettyxml(indent="  ")
-
-        # Add optional XSL stylesheet
-        if stylesheet:
-            stylesheet_declaration = f'<?xml-stylesheet type="text/xsl" href="{stylesheet}"?>\n'
-            pretty_xml = pretty_xml.replace('<?xml version="1.0" encoding="UTF-8"?>', f'<?xml version="1.0" encoding="UTF-8"?>\n{stylesheet_declaration}')
-
-        # Save the formatted XML to the file
-        with open(output_file, mode='w', encoding='utf-8') as file:
-            file.write(pretty_xml)
+                    self._element(key, value)
+            self._file.write('  </record>\n')
+            self.rows_written += 1
+        self._file.flush()
+
+    def position(self):
+        """
+        Sync the written records to disk and return where the output ends.
+
+        Returns:
+            dict: The size of the file in bytes (before the closing root tag), usable as `resume_from`.
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {"offset": self._file.buffer.tell()}
+
+    def close(self):
+        """
+        Close the root element and the underlying file.
+        """
+        if not self._file.closed:
+            self._file.write('</ListRecords>\n')
+            self._file.close()
+
+class ParquetRecordWriter:
+    """
+    Incrementally write harvested records to a Parquet file, one row group per page.
+
+    Columns are strings, except the multi-valued ones (by default `type` and
+    `subject`), which are lists of dictionary-encoded strings: repeated values
+    are stored once per row group and can be filtered with Arrow list kernels
+    (e.g. `pyarrow.compute.list_flatten`). Downstream stages can read only the
+    columns they need with `pd.read_parquet(path, columns=[...])`.
+
+    A Parquet file is only readable once its footer has been written by
+    `close()`, so an interrupted Parquet output cannot be resumed.
+
+    Args:
+        output_file (str): The file to save the Parquet output to.
+        fieldnames (list): The columns, in order.
+        resume_from (dict, optional): Not supported; passing a position raises ValueError.
+        compression (str, optional): The Parquet compression codec (default: "zstd").
+        multi_valued (list, optional): The columns holding lists (default: `type` and `subject`).
+    """
+
+    def __init__(self, output_file, fieldnames, resume_from=None, compression="zstd", multi_valued=None):
+        if pq is None:
+            raise ImportError("pyarrow is not installed. Install it using 'pip install pyarrow'.")
+        if resume_from is not None:
+            raise ValueError(f"Parquet output {output_file} cannot be resumed; restart the harvest without --resume.")
+        self.output_file = output_file
+        self.fieldnames = fieldnames
+        self.rows_written = 0
+        multi_valued = MULTI_VALUED_FIELDS if multi_valued is None else multi_valued
+        self.schema = pa.schema([
+            (name, pa.list_(pa.dictionary(pa.int32(), pa.string())) if name in multi_valued else pa.string())
+            for name in fieldnames
+        ])
+        self._writer = pq.ParquetWriter(output_file, self.schema, compression=compression)
+
+    def write_page(self, records):
+        """
+        Write a page (any iterable) of records as one row group.
+        """
+        records = list(records)
+        if not records:
+            return
+        table = pa.Table.from_pylist(records, schema=self.schema)
+        self._writer.write_table(table, row_group_size=len(records))
+        self.rows_written += len(records)
+
+    def position(self):
+        """
+        Return the number of rows written; kept in checkpoints for information only.
+        """
+        return {"rows": self.rows_written}
+
+    def close(self):
+        """
+        Write the Parquet footer and close the file.
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+class HarvestOutputs:
+    """
+    The output writers of one harvest, kept in step with its checkpoint.
+
+    Each page is written to every output, then the checkpoint (if any) is
+    updated with the position of each output. A checkpoint that already holds
+    progress resumes its own outputs at their recorded positions, and the
+    output files and shard size passed in are ignored.
+
+    Args:
+        fieldnames (list): The output columns, in order.
+        csv_output_file (str, optional): The file to save the CSV output to.
+        xml_output_file (str, optional): The file to save the XML output to.
+        checkpoint (HarvestCheckpoint, optional): The checkpoint to keep up to date.
+        shard_rows (int, optional): Rotate the CSV output into shards of this many rows.
+        parquet_output_file (str, optional): The file to save the Parquet output to.
+        multi_valued (list, optional): The columns holding lists, for the Parquet schema.
+    """
+
+    def __init__(self, fieldnames, csv_output_file=None, xml_output_file=None, checkpoint=None, shard_rows=None,
+                 parquet_output_file=None, multi_valued=None):
+        self.checkpoint = checkpoint
+        resuming = checkpoint is not None and checkpoint.pages > 0
+        if resuming:
+            outputs = checkpoint.outputs
+            shard_rows = checkpoint.shard_rows
+            positions = checkpoint.positions
+        else:
+            outputs = {}
+            if csv_output_file:
+                outputs["csv"] = csv_output_file
+            if xml_output_file:
+                outputs["xml"] = xml_output_file
+            if parquet_output_file:
+                outputs["parquet"] = parquet_output_file
+            positions = {}
+            if checkpoint is not None:
+                checkpoint.outputs = outputs
+                checkpoint.shard_rows = shard_rows
+
+        self.writers = {}
+        self.written = checkpoint.records if resuming else 0
+        try:
+            if "csv" in outputs:
+                self.writers["csv"] = CSVRecordWriter(outputs["csv"], fieldnames, positions.get("csv"), shard_rows)
+            if "xml" in outputs:
+                self.writers["xml"] = XMLRecordWriter(outputs["xml"], resume_from=positions.get("xml"))
+            if "parquet" in outputs:
+                self.writers["parquet"] = ParquetRecordWriter(outputs["parquet"], fieldnames, positions.get("parquet"),
+                                                              multi_valued=multi_valued)
+        except Exception:
+            self.close()
+            raise
+
+    def write_page(self, records, resumption_token=None):
+        """
+        Write a page of records to every output and update the checkpoint.
+
+        Args:
+            records (list): The records of the page.
+            resumption_token (str, optional): The token of the next page, stored in the checkpoint.
+        """
+        for writer in self.writers.values():
+            writer.write_page(records)
+        self.written += len(records)
+        if self.checkpoint is not None and self.writers:
+            self.checkpoint.update(resumption_token, self.written,
+                                   {name: writer.position() for name, writer in self.writers.items()})
+
+    def close(self):
+        """
+        Close every output; the checkpoint is left in place.
+        """
+        for writer in self.writers.values():
+            writer.close()
+
+def merge_csv_records(output_file, changes_file, key="identifier"):
+    """
+    Merge the records of `changes_file` into `output_file`, replacing records with the same key.
+
+    The existing output is streamed row by row into a temporary file, skipping
+    rows superseded by a changed record, the changed records are appended and the
+    result replaces the original atomically. Only the keys of the changed records
+    are held in memory.
+
+    Args:
+        output_file (str): The CSV file holding the previous harvest.
+        changes_file (str): The CSV file holding new and changed records, with the same columns.
+        key (str, optional): The column identifying a record.
+
+    Returns:
+        int: The number of rows in the merged file.
+    """
+    with open(changes_file, mode='r', newline='', encoding='utf-8') as file:
+        changed_keys = {row[key] for row in csv.DictReader(file)}
+
+    tmp_file = f"{output_file}.tmp"
+    rows = 0
+    with open(output_file, mode='r', newline='', encoding='utf-8') as existing, \
+            open(tmp_file, mode='w', newline='', encoding='utf-8') as merged:
+        reader = csv.DictReader(existing)
+        writer = csv.DictWriter(merged, fieldnames=reader.fieldnames)
+        writer.writeheader()
+        for row in reader:
+            if row[key] not in changed_keys:
+                writer.writerow(row)
+                rows += 1
+        with open(changes_file, mode='r', newline='', encoding='utf-8') as file:
+            for row in csv.DictReader(file):
+                writer.writerow(row)
+                rows += 1
+    os.replace(tmp_file, output_file)
+    return rows
+
+def save_to_xml(records, output_file, stylesheet=None):
+    """
+    Save records to an XML file with optional XSL stylesheet.
+
+    Args:
+        records (iterable): The records to save; a generator is consumed lazily.
+        output_file (str): The file to save the XML output to.
+        stylesheet (str, optional): The path to an XSL stylesheet to include in the XML.
+    """
+    try:
+        writer = XMLRecordWriter(output_file, stylesheet)
+        try:
+            writer.write_page(records)
+        finally:
+            writer.close()
     except Exception as e:
         print(f"Error saving records to XML: {e}")
         sys.exit(1)
 
 def save_to_csv(records, output_file):
     """
-    Save records to a CSV file.
+    Save PICO records to a CSV file, one column per field of `PICO_FIELD_MAP`.
+
+    Args:
+        records (iterable): The records to save; a generator is consumed lazily.
+        output_file (str): The file to save the CSV output to.
     """
     try:
-        with open(output_file, mode='w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ["title", "description", "type", "subject"]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            writer.writeheader()
-            for record in records:
-                writer.writerow(record)
+        writer = CSVRecordWriter(output_file, PICO_FIELD_MAP.columns)
+        try:
+            writer.write_page(records)
+        finally:
+            writer.close()
     except Exception as e:
         print(f"Error saving to CSV: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
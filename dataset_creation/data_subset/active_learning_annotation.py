@@ -1,14 +1,19 @@
 import os
+import sys
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 from sklearn.cluster import KMeans
 from sklearn.metrics import pairwise_distances_argmin_min
 
+# Dataset helpers shared by the dataset_creation scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dataset_io import read_dataset
+
 def load_annotated_data(file_path, text_column, label_column, domain_column):
-    """Loads the annotated dataset from a CSV file."""
+    """Loads the annotated dataset from a CSV or Parquet file."""
     try:
-        df = pd.read_csv(file_path)
+        df = read_dataset(file_path, [text_column, label_column, domain_column])
         return df[[text_column, label_column, domain_column]].dropna()
     except FileNotFoundError:
         print(f"Error: File not found at {file_path}")
@@ -63,7 +68,7 @@ def create_unlabelled_test_dataset(
     Creates an unlabelled test dataset by taking a batch of rows from each source file.
 
     Args:
-        source_files (list of str): List of CSV file paths to sample from.
+        source_files (list of str): List of CSV (or Parquet) file paths to sample from.
         batch_num (int): Which batch to extract (0 = first 100, 1 = 101-200, ...).
         batch_size (int): Number of rows per batch per file.
         output_dir (str): Directory to save the batch CSV.
@@ -75,7 +80,7 @@ def create_unlabelled_test_dataset(
 
     for file_path in source_files:
         try:
-            df = pd.read_csv(file_path)
+            df = read_dataset(file_path)
             batch_df = df.iloc[start:end].copy()
             batch_df['source_file'] = os.path.basename(file_path)
             batch_dfs.append(batch_df)
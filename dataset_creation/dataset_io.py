@@ -0,0 +1,19 @@
+import pandas as pd
+
+def read_dataset(file_path, columns=None):
+    """
+    Reads a CSV or Parquet dataset into a DataFrame.
+
+    Parquet files (e.g. written by the harvester with --parquet) are read
+    column by column, so only the requested columns are loaded.
+
+    Args:
+        file_path (str): The path to a .csv or .parquet file.
+        columns (list of str, optional): The columns to load (default: all).
+
+    Returns:
+        pd.DataFrame: The loaded data.
+    """
+    if file_path.endswith('.parquet'):
+        return pd.read_parquet(file_path, columns=columns)
+    return pd.read_csv(file_path, usecols=columns)